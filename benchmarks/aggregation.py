@@ -0,0 +1,97 @@
+"""Compare columnar usage aggregation with the previous per-row aggregation.
+
+The per-row variant is how fetch_usage_data used to aggregate usage: one dict and one pd.Timedelta per entry, followed
+by a DataFrame built from the rows (as the Excel writer did).
+
+    uv run python benchmarks/aggregation.py
+    uv run python benchmarks/aggregation.py --entries 10000 100000 --json aggregation.json
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import pandas as pd
+
+from zaptec_reporter import usage as zusage
+
+
+def installation_reports(entries, entries_per_installation=100):
+    return [
+        {
+            "InstallationName": f"Installation {i}",
+            "GroupedBy": "Charger",
+            "totalUserChargerReportModel": [
+                {
+                    "GroupAsString": f"Charger {j}",
+                    "TotalChargeSessionCount": j,
+                    "TotalChargeSessionEnergy": j * 1.2345,
+                    "TotalChargeSessionDuration": j * 0.987654321,
+                }
+                for j in range(entries_per_installation)
+            ],
+        }
+        for i in range(entries // entries_per_installation)
+    ]
+
+
+def aggregate_per_row(reports):
+    usage = []
+    for report in reports:
+        for entry in report["totalUserChargerReportModel"]:
+            usage.append(
+                {
+                    report["GroupedBy"]: entry["GroupAsString"],
+                    "Energy": entry["TotalChargeSessionEnergy"],
+                    "Duration": str(pd.Timedelta(hours=entry["TotalChargeSessionDuration"]).round("s")),
+                    "Sessions": entry["TotalChargeSessionCount"],
+                    "Installation": report["InstallationName"],
+                }
+            )
+
+    return pd.DataFrame(usage)
+
+
+def aggregate_columnar(reports):
+    columns, rows = zusage.usage_table(zusage.aggregate_usage(reports))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def measure(aggregate, reports, runs):
+    wall_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        aggregate(reports)
+        wall_times.append(time.perf_counter() - start)
+
+    return statistics.median(wall_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare columnar and per-row usage aggregation.")
+    parser.add_argument("--entries", help="Number of usage entries.", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--runs", help="Number of runs per measurement.", type=int, default=3)
+    parser.add_argument("--json", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'Aggregation':<14}{'Entries':>10}{'Wall (s)':>10}")
+    for entries in args.entries:
+        reports = installation_reports(entries)
+
+        # Make sure that both aggregations agree before measuring them.
+        assert aggregate_per_row(reports[:10]).equals(aggregate_columnar(reports[:10]))
+
+        for name, aggregate in {"per-row": aggregate_per_row, "columnar": aggregate_columnar}.items():
+            wall_time = measure(aggregate, reports, args.runs)
+            results.append({"aggregation": name, "entries": entries, "wall_time": wall_time})
+            print(f"{name:<14}{entries:>10}{wall_time:>10.3f}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""End-to-end benchmark of the report command against a local mock Zaptec API (see mock_api.py).
+
+Every run starts a fresh reporter process, just like a scheduled report would, which authorizes, lists all
+installations, fetches their reports and renders an Excel report. Wall time, peak RSS and, per phase, wall time (as
+recorded by --metrics) and requests made are recorded for every number of installations.
+
+    uv run python benchmarks/e2e.py
+    uv run python benchmarks/e2e.py --installations 1 10 100 1000 --latency 0.02 --json e2e.json
+    uv run python benchmarks/e2e.py --installations 1000 --profile profiles
+"""
+
+import argparse
+import collections
+import json
+import pathlib
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from mock_api import MockAPIServer
+
+# Phases of a report, and the API endpoints requested by each of them.
+PHASES = ["authorize", "installations", "fetch", "aggregate", "render", "write"]
+ENDPOINT_PHASES = {
+    "/oauth/token": "authorize",
+    "/api/installation": "installations",
+    "/api/chargehistory/installationreport": "fetch",
+}
+
+
+def child(result_path, argv):
+    # Runs in the benchmarked process. Phases are timed by the reporter itself, and written along with peak RSS.
+    from zaptec_reporter import reporter as zreporter
+
+    metrics_path = f"{result_path}.metrics"
+    error = None
+    try:
+        zreporter.main([f"--metrics={metrics_path}", *argv])
+    except Exception as e:
+        error = str(e)
+
+    with open(metrics_path) as f:
+        phases = json.load(f)["phases"]
+
+    # Peak RSS is reported in KiB on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with open(result_path, "w") as f:
+        json.dump({"phases": phases, "peak_rss": peak_rss, "error": error}, f)
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(server, installations, args, directory):
+    server.installations = installations
+    server.reset()
+
+    argv = [
+        f"--api-url={server.url}",
+        "--username=benchmark",
+        "--password=benchmark",
+        "--no-cache",
+        "report",
+        "--all-installations",
+        f"--concurrency={args.concurrency}",
+        "--from-date=2024-12",
+        "--to-date=2025-01",
+        f"--excelout={directory / 'report.xlsx'}",
+        f"--excel-writer={args.excel_writer}",
+    ]
+    if args.profile is not None:
+        argv.insert(0, f"--profile={args.profile / str(installations)}")
+
+    result_path = directory / "result.json"
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, __file__, "--child", str(result_path), *argv], stdout=subprocess.DEVNULL)
+    wall_time = time.perf_counter() - start
+
+    result = json.loads(result_path.read_text())
+    requests = collections.Counter()
+    for path, count in server.requests.items():
+        requests[ENDPOINT_PHASES.get(path, path)] += count
+
+    return {
+        "installations": installations,
+        "chargers": args.chargers,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "concurrency": args.concurrency,
+        "excel_writer": args.excel_writer,
+        "wall_time": wall_time,
+        "peak_rss": result["peak_rss"],
+        "phases": {
+            phase: {"wall_time": result["phases"].get(phase, 0.0), "requests": requests.get(phase, 0)}
+            for phase in PHASES
+        },
+        "error": result["error"],
+    }
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3:])
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark the report command end-to-end against a mock API.")
+    parser.add_argument(
+        "--installations", help="Numbers of installations.", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--chargers", help="Number of chargers per installation.", type=int, default=10)
+    parser.add_argument("--latency", help="Latency in seconds of every API request.", type=float, default=0.02)
+    parser.add_argument("--error-rate", help="Share of API requests that fail.", type=float, default=0.0)
+    parser.add_argument("--concurrency", help="Report concurrency.", type=int, default=8)
+    parser.add_argument("--excel-writer", choices=["pandas", "streaming"], default="streaming")
+    parser.add_argument("--json", help="Write results as JSON to this file.")
+    parser.add_argument(
+        "--profile", help="Write a profile of every run to this directory (see --profile).", type=pathlib.Path
+    )
+    args = parser.parse_args()
+
+    server = MockAPIServer(("127.0.0.1", 0), chargers=args.chargers, latency=args.latency, error_rate=args.error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Results are tagged with revision and time, so that they may be compared over time.
+    metadata = {"revision": revision(), "timestamp": datetime.now().isoformat(), "python": platform.python_version()}
+
+    results = []
+    print(
+        f"{'Installations':<15}{'Wall (s)':>10}{'RSS (MiB)':>11}{'Requests':>10}"
+        + "".join(f"{phase + ' (s)':>19}" for phase in PHASES)
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for installations in args.installations:
+            result = {**metadata, **run(server, installations, args, pathlib.Path(directory))}
+            results.append(result)
+
+            requests = sum(phase["requests"] for phase in result["phases"].values())
+            print(
+                f"{installations:<15}{result['wall_time']:>10.3f}{result['peak_rss']:>11.1f}{requests:>10}"
+                + "".join(f"{result['phases'][phase]['wall_time']:>19.3f}" for phase in PHASES)
+                + (f"  failed: {result['error']}" if result["error"] is not None else "")
+            )
+
+    server.shutdown()
+    server.server_close()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
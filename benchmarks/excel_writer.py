@@ -0,0 +1,82 @@
+"""Compare the pandas and streaming Excel writers.
+
+Writes synthetic usage reports of increasing size with both writers and reports wall time, peak traced memory and
+output size.
+
+    uv run python benchmarks/excel_writer.py
+    uv run python benchmarks/excel_writer.py --rows 1000 10000 100000 --json excel_writer.json
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from zaptec_reporter import reporter as zreporter
+
+
+def usage_data(rows):
+    return {
+        "Usage": [
+            {
+                "Charger": f"Charger {i % 100}",
+                "Energy": i * 1.2345,
+                "Duration": f"{i % 30} days {i % 24:02}:{i % 60:02}:{i % 60:02}",
+                "Sessions": i % 50,
+                "Installation": f"Installation {i // 100}",
+            }
+            for i in range(rows)
+        ],
+        "Metadata": {
+            "Generated": datetime.now(),
+            "From": datetime(2024, 12, 1),
+            "To": datetime(2025, 1, 1),
+            "Timezone": "Central European Standard Time",
+        },
+    }
+
+
+def measure(writer, data):
+    # Measure time and memory in separate runs, since tracing memory slows everything down.
+    start = time.perf_counter()
+    buffer = writer(data)
+    wall_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    writer(data)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"wall_time": wall_time, "peak_memory": peak_memory, "size": len(buffer.getbuffer())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the pandas and streaming Excel writers.")
+    parser.add_argument("--rows", help="Number of usage rows to write.", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--json", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    # Warm up imports, so that they are not included in the measurements.
+    for writer in zreporter.EXCEL_WRITERS.values():
+        writer(usage_data(1))
+
+    results = []
+    print(f"{'Writer':<12}{'Rows':>10}{'Wall (s)':>10}{'Peak (MiB)':>12}{'Size (KiB)':>12}")
+    for rows in args.rows:
+        data = usage_data(rows)
+        for name, writer in zreporter.EXCEL_WRITERS.items():
+            result = {"writer": name, "rows": rows, **measure(writer, data)}
+            results.append(result)
+            print(
+                f"{name:<12}{rows:>10}{result['wall_time']:>10.3f}"
+                f"{result['peak_memory'] / 2**20:>12.1f}{result['size'] / 2**10:>12.1f}"
+            )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""A local stand-in for the Zaptec Cloud API, with configurable latency, installations, chargers and error rate.
+
+Serves the endpoints used by zaptec-reporter, and counts the requests made to each of them.
+
+    uv run python benchmarks/mock_api.py --port 8081 --installations 100
+    uv run zaptec-reporter --api-url http://127.0.0.1:8081 -u user -p password --no-cache report -a
+"""
+
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PAGE_SIZE = 100
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    def respond(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, method):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count(url.path)
+
+        # Respond just like a remote server would, slowly and sometimes not at all.
+        time.sleep(self.server.latency)
+        if self.server.fail():
+            self.respond(500)
+            return
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if ("POST", "/oauth/token") == (method, url.path):
+            self.respond(200, {"access_token": "mocktoken", "expires_in": 86400})
+        elif ("GET", "/api/installation") == (method, url.path):
+            self.respond(200, self.server.installations_page(int(query.get("PageIndex", 0))))
+        elif ("POST", "/api/chargehistory/installationreport") == (method, url.path):
+            self.respond(200, self.server.installation_report(json.loads(body)))
+        elif ("GET", "/api/chargehistory") == (method, url.path):
+            self.respond(200, self.server.charge_history(query))
+        else:
+            self.respond(404)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, installations=10, chargers=10, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(address, MockAPIHandler)
+        self.installations = installations
+        self.chargers = chargers
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = collections.Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] += 1
+
+    def fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+
+    def installations_page(self, page_index):
+        start = page_index * PAGE_SIZE
+        return {
+            "Pages": max((self.installations + PAGE_SIZE - 1) // PAGE_SIZE, 1),
+            "Data": [
+                {"Id": f"installation-{i}", "Name": f"Installation {i}"}
+                for i in range(start, min(start + PAGE_SIZE, self.installations))
+            ],
+        }
+
+    def installation_report(self, request_json):
+        installation = request_json["installationId"].rpartition("-")[2]
+        return {
+            "InstallationName": f"Installation {installation}",
+            "InstallationTimeZone": "Central European Standard Time",
+            "GroupedBy": "Charger",
+            "Fromdate": request_json["fromDate"],
+            "Enddate": request_json["endDate"],
+            "totalUserChargerReportModel": [
+                {
+                    "GroupAsString": f"Charger {installation}-{i}",
+                    "TotalChargeSessionCount": i + 1,
+                    "TotalChargeSessionEnergy": (i + 1) * 12.345,
+                    "TotalChargeSessionDuration": (i + 1) * 1.2345,
+                }
+                for i in range(self.chargers)
+            ],
+        }
+
+    def charge_history(self, query):
+        page_index = int(query.get("PageIndex", 0))
+        page_size = int(query.get("PageSize", PAGE_SIZE))
+        sessions = self.chargers * 30
+        start = page_index * page_size
+        return {
+            "Pages": max((sessions + page_size - 1) // page_size, 1),
+            "Data": [
+                {
+                    "Id": f"{query['InstallationId']}-session-{i}",
+                    "DeviceName": f"Charger {i % self.chargers}",
+                    "StartDateTime": query["From"],
+                    "EndDateTime": query["To"],
+                    "Energy": 12.345,
+                }
+                for i in range(start, min(start + page_size, sessions))
+            ],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Zaptec Cloud API.")
+    parser.add_argument("--port", help="Port to listen on.", type=int, default=8081)
+    parser.add_argument("--installations", help="Number of installations.", type=int, default=10)
+    parser.add_argument("--chargers", help="Number of chargers per installation.", type=int, default=10)
+    parser.add_argument("--latency", help="Latency in seconds of every request.", type=float, default=0.0)
+    parser.add_argument("--error-rate", help="Share of requests that fail.", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockAPIServer(("127.0.0.1", args.port), args.installations, args.chargers, args.latency, args.error_rate)
+    print(f"Serving mock Zaptec API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(dict(server.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compare rendering many Excel reports one at a time with rendering them in worker processes.
+
+uv run python benchmarks/rendering.py
+uv run python benchmarks/rendering.py --reports 100 --rows 1000 --workers 1 2 4 --json rendering.json
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+
+from zaptec_reporter import reporter as zreporter
+from zaptec_reporter import usage as zusage
+
+
+def datasets(reports, rows):
+    installation_reports = [
+        {
+            "InstallationName": "Installation A",
+            "GroupedBy": "Charger",
+            "totalUserChargerReportModel": [
+                {
+                    "GroupAsString": f"Charger {i}",
+                    "TotalChargeSessionCount": i,
+                    "TotalChargeSessionEnergy": i * 1.2345,
+                    "TotalChargeSessionDuration": i * 0.987654321,
+                }
+                for i in range(rows)
+            ],
+        }
+    ]
+    usage = zusage.aggregate_usage(installation_reports)
+    return [{"Usage": usage, "Metadata": {"Generated": datetime(2025, 1, 1), "Report": i}} for i in range(reports)]
+
+
+def measure(data, excel_writer, workers, runs):
+    wall_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        zreporter.render_excel_reports(data, excel_writer, workers)
+        wall_times.append(time.perf_counter() - start)
+
+    return statistics.median(wall_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial and parallel Excel report rendering.")
+    parser.add_argument("--reports", help="Number of reports to render.", type=int, default=100)
+    parser.add_argument("--rows", help="Number of usage rows per report.", type=int, default=1000)
+    parser.add_argument("--workers", help="Numbers of worker processes.", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--excel-writer", choices=zreporter.EXCEL_WRITERS.keys(), default="streaming")
+    parser.add_argument("--runs", help="Number of runs per measurement.", type=int, default=3)
+    parser.add_argument("--json", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    data = datasets(args.reports, args.rows)
+
+    results = []
+    print(f"{'Workers':<10}{'Reports':>10}{'Wall (s)':>10}")
+    for workers in args.workers:
+        wall_time = measure(data, args.excel_writer, workers, args.runs)
+        results.append({"workers": workers, "reports": args.reports, "rows": args.rows, "wall_time": wall_time})
+        print(f"{workers:<10}{args.reports:>10}{wall_time:>10.3f}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure CLI startup time per subcommand.
+
+Every scenario is run in a fresh interpreter with `-X importtime`, so that the numbers reflect a cold start of the
+`zaptec-reporter` entrypoint. Scenarios use `--dry-run`, which exits right before talking to Zaptec Cloud.
+
+    uv run python benchmarks/startup.py
+    uv run python benchmarks/startup.py --runs 10 --json startup.json
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = {
+    "import": None,
+    "help": ["--help"],
+    "installations": ["--dry-run", "-p", "token", "installations"],
+    "report": ["--dry-run", "-p", "token", "report", "--from-date", "2024-12", "--to-date", "2025-01", "abc"],
+    "report (relative dates)": ["--dry-run", "-p", "token", "report", "abc"],
+}
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def run_scenario(argv):
+    code = "import zaptec_reporter"
+    if argv is not None:
+        code += f"\ntry:\n    zaptec_reporter.main({argv!r})\nexcept SystemExit:\n    pass"
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    wall_time = time.perf_counter() - start
+
+    # Sum the cumulative import time of top-level imports.
+    import_time = 0
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match is None:
+            continue
+
+        cumulative, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent == 1:
+            import_time += cumulative
+            modules[module] = cumulative
+
+    return wall_time, import_time / 1e6, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure zaptec-reporter startup time per subcommand.")
+    parser.add_argument("--runs", help="Number of runs per scenario.", type=int, default=5)
+    parser.add_argument("--top", help="Number of heaviest top-level imports to show.", type=int, default=3)
+    parser.add_argument("--json", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'Scenario':<26}{'Wall (s)':>10}{'Imports (s)':>13}  Heaviest imports")
+    for name, argv in SCENARIOS.items():
+        runs = [run_scenario(argv) for _ in range(args.runs)]
+        wall_time = statistics.median(run[0] for run in runs)
+        import_time = statistics.median(run[1] for run in runs)
+        heaviest = sorted(runs[-1][2].items(), key=lambda module: module[1], reverse=True)[: args.top]
+
+        results[name] = {"wall_time": wall_time, "import_time": import_time, "heaviest_imports": dict(heaviest)}
+        heaviest_str = ", ".join(f"{module} {cumulative / 1e6:.3f}s" for module, cumulative in heaviest)
+        print(f"{name:<26}{wall_time:>10.3f}{import_time:>13.3f}  {heaviest_str}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,59 @@
+import codecs
+import collections
+import concurrent.futures
+import json
 import logging
-import requests
+import pathlib
+import re
+import reprlib
+import threading
+import time
 from enum import Flag, auto
 
+from zaptec_reporter import files as zfiles
+from zaptec_reporter import metrics as zmetrics
+
+DEFAULT_BASE_URL = "https://api.zaptec.com"
+
+# Installation reports are parsed as they are read, keeping only what usage is aggregated from.
+REPORT_ENTRIES = "totalUserChargerReportModel"
+REPORT_ENTRY_FIELDS = (
+    "GroupAsString",
+    "TotalChargeSessionCount",
+    "TotalChargeSessionEnergy",
+    "TotalChargeSessionDuration",
+)
+REPORT_CHUNK_SIZE = 64 * 1024
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Charge sessions are written with these columns first, whether or not the first sessions have them.
+CHARGE_SESSION_FIELDS = (
+    "Id",
+    "DeviceId",
+    "DeviceName",
+    "ChargerId",
+    "StartDateTime",
+    "EndDateTime",
+    "Energy",
+    "CommitMetadata",
+    "CommitEndDateTime",
+    "UserId",
+    "UserFullName",
+    "UserEmail",
+    "TokenName",
+    "ExternallyEnded",
+    "ExternalId",
+)
+
+# Payloads are logged in brief, so that large reports do not flood the log.
+PAYLOAD_REPR = reprlib.Repr(maxlevel=3, maxdict=10, maxlist=5, maxstring=80, maxother=80)
+
+
+def debug_payload(payload):
+    # Only format payloads if they are going to be logged.
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(PAYLOAD_REPR.repr(payload))
+
 
 class UserRole(Flag):
     NONE = 0
@@ -28,9 +80,180 @@ class InstallationGroupBy(Flag):
     CHARGE_CARD_NAME = auto()
 
 
+class TokenCache:
+    def __init__(self, path, margin=300):
+        self.path = pathlib.Path(path)
+        self.margin = margin
+
+    def read(self):
+        try:
+            return json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def load(self, username):
+        token = self.read().get(username)
+        if token is None:
+            return None
+
+        # Only reuse tokens that are not about to expire.
+        if token["expires_at"] - self.margin < time.time():
+            return None
+
+        return token
+
+    def store(self, username, access_token, expires_at):
+        tokens = self.read()
+        tokens[username] = {"access_token": access_token, "expires_at": expires_at}
+
+        # Tokens are never readable by others.
+        zfiles.write_atomic(self.path, json.dumps(tokens), private=True)
+
+
+class JSONStream:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        # Drop what has already been parsed, and read another chunk.
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        # Next character that is not whitespace.
+        while True:
+            self.position = JSON_WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON document.")
+
+    def expect(self, characters):
+        character = self.peek()
+        if character not in characters:
+            raise ValueError(f"Expected one of {characters!r} in JSON document, got {character!r}.")
+
+        self.position += 1
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            # Values cut short by the end of a chunk are parsed again once the next chunk is read. Values are only taken
+            # if followed by something, as numbers cut short are valid numbers too.
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            self.fill()
+
+
+def iter_report(chunks):
+    # Yield the top level items of an installation report as they are read, and every report entry on its own.
+    stream = JSONStream(chunks)
+    stream.expect("{")
+    if "}" == stream.peek():
+        return
+
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if REPORT_ENTRIES == key and "[" == stream.peek():
+            stream.expect("[")
+            if "]" != stream.peek():
+                while True:
+                    yield key, stream.value()
+                    if "]" == stream.expect(",]"):
+                        break
+            else:
+                stream.expect("]")
+        else:
+            yield key, stream.value()
+
+        if "}" == stream.expect(",}"):
+            return
+
+
+def read_report(chunks):
+    report = {REPORT_ENTRIES: []}
+    for key, value in iter_report(chunks):
+        if REPORT_ENTRIES != key:
+            report[key] = value
+        elif value is not None:
+            report[key].append({field: value[field] for field in REPORT_ENTRY_FIELDS if field in value})
+
+    return report
+
+
+def iter_response_text(response, chunk_size=REPORT_CHUNK_SIZE):
+    # JSON is always UTF-8, whatever the response says.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in response.iter_content(chunk_size):
+        yield decoder.decode(chunk)
+
+    yield decoder.decode(b"", final=True)
+
+
 class ZaptecAPI:
-    def __init__(self, access_token=None):
+    def __init__(
+        self,
+        access_token=None,
+        pool_size=10,
+        timeout=(10, 120),
+        token_cache=None,
+        report_cache=None,
+        usage_store=None,
+        base_url=DEFAULT_BASE_URL,
+    ):
         self.access_token = access_token
+        self.base_url = base_url.rstrip("/")
+        self.expires_at = None
+        self.credentials = None
+        self.timeout = timeout
+        self.token_cache = token_cache
+        self.report_cache = report_cache
+        self.usage_store = usage_store
+        if usage_store is not None:
+            usage_store.bind(self.base_url)
+        self.token_lock = threading.Lock()
+
+        # Requests is imported here, so that commands which never talk to Zaptec Cloud start quickly.
+        import requests
+
+        # Reuse keep-alive connections for all requests, also when requests are made from several threads.
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Record the latency of every request, but only when metrics are enabled.
+        if zmetrics.enabled:
+            self.session.hooks["response"].append(zmetrics.observe_response)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
 
     def auth_header(self):
         if self.access_token is None:
@@ -38,28 +261,106 @@ class ZaptecAPI:
 
         return f"Bearer {self.access_token}"
 
-    def authorize(self, username, password):
-        AUTH_URL = "https://api.zaptec.com/oauth/token"
+    def authorize(self, username, password, force=False):
+        AUTH_URL = f"{self.base_url}/oauth/token"
+
+        # Remember credentials to be able to refresh the access token.
+        self.credentials = (username, password)
+
+        # Reuse cached access token.
+        if self.token_cache is not None and not force:
+            token = self.token_cache.load(username)
+            if token is not None:
+                logging.info(f"Using cached access token for user {username}.")
+                self.access_token = token["access_token"]
+                self.expires_at = token["expires_at"]
+                return
 
         # Authorize.
         logging.info(f"Authorizing user {username}.")
-        response = requests.post(
+        response = self.session.post(
             AUTH_URL,
             data={"grant_type": "password", "username": username, "password": password},
+            timeout=self.timeout,
         )
         response.raise_for_status()
 
         # Read token.
         response_json = response.json()
         self.access_token = response_json["access_token"]
+        self.expires_at = time.time() + response_json["expires_in"] if "expires_in" in response_json else None
 
-    def fetch_installations(
+        if self.token_cache is not None and self.expires_at is not None:
+            self.token_cache.store(username, self.access_token, self.expires_at)
+
+    def refresh(self, access_token):
+        # Only refresh once, even if several threads got rejected by the same access token.
+        with self.token_lock:
+            if self.access_token == access_token:
+                self.authorize(*self.credentials, force=True)
+
+    def request(self, method, url, **kwargs):
+        # Refresh access token shortly before it expires.
+        access_token = self.access_token
+        if self.credentials is not None and self.expires_at is not None and self.expires_at - 60 < time.time():
+            self.refresh(access_token)
+
+        access_token = self.access_token
+        response = self.session.request(
+            method, url, headers={"Authorization": self.auth_header()}, timeout=self.timeout, **kwargs
+        )
+
+        # Refresh access token and retry once if it was rejected.
+        if response.status_code == 401 and self.credentials is not None:
+            logging.info("Access token was rejected, refreshing it.")
+            zmetrics.count("retries")
+            response.close()
+            self.refresh(access_token)
+            response = self.session.request(
+                method, url, headers={"Authorization": self.auth_header()}, timeout=self.timeout, **kwargs
+            )
+
+        try:
+            response.raise_for_status()
+        except Exception:
+            # Release the connection of streamed responses that are never read.
+            response.close()
+            raise
+
+        return response
+
+    def fetch_page(self, url, params):
+        response = self.request("GET", url, params=params)
+
+        response_json = response.json()
+        debug_payload(response_json)
+
+        return response_json
+
+    def iter_pages(self, url, params, concurrency=1):
+        # Fetch the first page to find out how many pages there are.
+        page = self.fetch_page(url, params)
+        yield from page["Data"]
+
+        # Fetch the remaining pages concurrently, but yield them in order and never run too far ahead.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = collections.deque()
+            for page_index in range(1, page["Pages"]):
+                futures.append(executor.submit(self.fetch_page, url, {**params, "PageIndex": page_index}))
+                if len(futures) >= concurrency:
+                    yield from futures.popleft().result()["Data"]
+
+            while len(futures) > 0:
+                yield from futures.popleft().result()["Data"]
+
+    def iter_installations(
         self,
         user_role=UserRole.OWNER,
         installation_type=InstallationType.PRO,
         include_disabled=False,
+        concurrency=1,
     ):
-        INSTALLATIONS_URL = "https://api.zaptec.com/api/installation"
+        INSTALLATIONS_URL = f"{self.base_url}/api/installation"
         params = {
             "Roles": user_role.value,
             "InstallationType": installation_type.value,
@@ -69,24 +370,46 @@ class ZaptecAPI:
         }
 
         logging.info("Fetching installations.")
-        response = requests.get(
-            INSTALLATIONS_URL,
-            headers={"Authorization": self.auth_header()},
-            params=params,
-        )
-        response.raise_for_status()
+        yield from self.iter_pages(INSTALLATIONS_URL, params, concurrency)
 
-        response_json = response.json()
-        logging.debug(response_json)
+    def fetch_installations(
+        self,
+        user_role=UserRole.OWNER,
+        installation_type=InstallationType.PRO,
+        include_disabled=False,
+        concurrency=1,
+    ):
+        with zmetrics.phase("installations"):
+            installations = self.iter_installations(user_role, installation_type, include_disabled, concurrency)
+            return {installation["Name"]: installation["Id"] for installation in installations}
+
+    def fetch_installation_ids(
+        self,
+        user_role=UserRole.OWNER,
+        installation_type=InstallationType.PRO,
+        include_disabled=False,
+        concurrency=1,
+    ):
+        # Installations are collected by ID, since several installations may share the same name.
+        with zmetrics.phase("installations"):
+            installations = self.iter_installations(user_role, installation_type, include_disabled, concurrency)
+            return list(dict.fromkeys(installation["Id"] for installation in installations))
 
-        pages = response_json["Pages"]
-        if pages > 1:
-            logging.warning(f"Some installations may not be shown (showing page 1 of {pages})")
+    def iter_charge_history(self, installation_id, date_from, date_to, page_size=1000, concurrency=1):
+        CHARGE_HISTORY_URL = f"{self.base_url}/api/chargehistory"
+        params = {
+            "InstallationId": installation_id,
+            "From": date_from,
+            "To": date_to,
+            "PageSize": page_size,
+        }
 
-        return {installation["Name"]: installation["Id"] for installation in response_json["Data"]}
+        # Sessions are yielded page by page, so that only a few pages are held in memory at a time.
+        logging.info(f"Fetching charge history for {installation_id}.")
+        yield from self.iter_pages(CHARGE_HISTORY_URL, params, concurrency)
 
     def fetch_installation_report(self, installation_id, date_from, date_to, group_by=InstallationGroupBy.CHARGER):
-        INSTALLATION_REPORT_URL = "https://api.zaptec.com/api/chargehistory/installationreport"
+        INSTALLATION_REPORT_URL = f"{self.base_url}/api/chargehistory/installationreport"
         json = {
             "fromDate": date_from,
             "endDate": date_to,
@@ -94,17 +417,35 @@ class ZaptecAPI:
             "groupBy": group_by.value,
         }
 
-        logging.debug(json)
+        debug_payload(json)
 
-        logging.info(f"Fetching installation report for {installation_id}.")
-        response = requests.post(
-            INSTALLATION_REPORT_URL,
-            headers={"Authorization": self.auth_header()},
-            json=json,
-        )
-        response.raise_for_status()
+        # Answer from the usage store.
+        if self.usage_store is not None:
+            response_json = self.usage_store.get(json)
+            if response_json is not None:
+                zmetrics.count("usage_store_hits")
+                return response_json
 
-        response_json = response.json()
-        logging.debug(response_json)
+        # Reuse previously fetched report. Reports are cached by API too, so that reports of other APIs (such as a mock
+        # API) are never reused.
+        response_json = None
+        cache_key = {**json, "url": INSTALLATION_REPORT_URL}
+        if self.report_cache is not None:
+            response_json = self.report_cache.get(cache_key)
+            zmetrics.count("report_cache_misses" if response_json is None else "report_cache_hits")
+
+        if response_json is None:
+            logging.info(f"Fetching installation report for {installation_id}.")
+            # Parse the report while it is being read, rather than reading all of it before parsing it.
+            with self.request("POST", INSTALLATION_REPORT_URL, json=json, stream=True) as response:
+                response_json = read_report(iter_response_text(response))
+
+            debug_payload(response_json)
+
+            if self.report_cache is not None:
+                self.report_cache.put(cache_key, response_json)
+
+        if self.usage_store is not None:
+            self.usage_store.put(json, response_json)
 
         return response_json
@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from datetime import datetime
+
+from zaptec_reporter import files as zfiles
+
+
+def default_cache_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache_home) / "zaptec-reporter"
+
+
+class ReportCache:
+    def __init__(self, directory, ttl=300, max_size=256 * 1024 * 1024, refresh=False):
+        self.directory = pathlib.Path(directory)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh = refresh
+        self.size = None
+        self.lock = threading.Lock()
+
+    def path(self, request_json):
+        key = hashlib.sha256(json.dumps(request_json, sort_keys=True).encode()).hexdigest()
+        return self.directory / f"{key}.json.gz"
+
+    def get(self, request_json):
+        if self.refresh:
+            return None
+
+        path = self.path(request_json)
+        try:
+            entry = json.loads(gzip.decompress(path.read_bytes()))
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+        # Reports covering periods that were still in progress are only kept for a short while.
+        if entry["expires_at"] is not None and entry["expires_at"] < time.time():
+            return None
+
+        # Mark entry as recently used.
+        path.touch()
+
+        logging.debug(f"Using cached installation report for {request_json['installationId']}.")
+        return entry["report"]
+
+    def put(self, request_json, report):
+        # Reports covering closed periods never change, so they are kept until evicted.
+        closed = datetime.fromisoformat(request_json["endDate"]) <= datetime.now()
+        expires_at = None if closed else time.time() + self.ttl
+
+        data = gzip.compress(json.dumps({"expires_at": expires_at, "report": report}).encode())
+
+        # Readers never see partial entries.
+        zfiles.write_atomic(self.path(request_json), data)
+
+        with self.lock:
+            if self.size is None:
+                self.size = sum(entry.stat().st_size for entry in self.directory.glob("*.json.gz"))
+            else:
+                self.size += len(data)
+
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        # Remove the least recently used entries until the cache fits within its size limit.
+        entries = []
+        for entry in self.directory.glob("*.json.gz"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if self.size <= self.max_size:
+                break
+
+            entry.unlink(missing_ok=True)
+            self.size -= size
+
+        logging.debug(f"Evicted installation reports from cache, {self.size} bytes remaining.")
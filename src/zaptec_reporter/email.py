@@ -1,10 +1,16 @@
-import jinja2 as jinja
+import concurrent.futures
+import contextlib
 import logging
 import smtplib
+import threading
 from email.message import EmailMessage
 from email.utils import formataddr
 from enum import StrEnum
 
+from zaptec_reporter import metrics as zmetrics
+from zaptec_reporter import sinks as zsinks
+from zaptec_reporter import templates as ztemplates
+
 
 class EmailEncryption(StrEnum):
     DISABLED = "disabled"
@@ -12,6 +18,137 @@ class EmailEncryption(StrEnum):
     IMPLICIT = "implicit"
 
 
+class EmailError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        failed = ", ".join(f"{recipient} ({error})" for recipient, error in errors.items())
+        super().__init__(f"Failed to send {len(errors)} emails: {failed}")
+
+
+class Recipient:
+    def __init__(self, to=list(), cc=list(), bcc=list(), name=None, chargers=None, installations=None):
+        self.to = to
+        self.cc = cc
+        self.bcc = bcc
+        self.name = name
+        self.chargers = chargers
+        self.installations = installations
+
+    def __str__(self):
+        return self.name or ", ".join(self.to + self.cc + self.bcc)
+
+    def filter_usage(self, usage):
+        # Only keep usage from the chargers and installations that belong to the recipient.
+        mask = [True] * len(usage)
+        for column_name, names in (("Charger", self.chargers), ("Installation", self.installations)):
+            if names is not None:
+                column = usage.columns.get(column_name, [None] * len(usage))
+                mask = [keep and value in names for keep, value in zip(mask, column)]
+
+        return usage.filter(mask)
+
+    def filter_values(self, values):
+        # Every view is filtered just like the usage, so that no recipient gets usage that belongs to others.
+        filtered_values = {**values, "Usage": self.filter_usage(values["Usage"]), "Recipient": self}
+        if "Views" in values:
+            filtered_values["Views"] = {name: self.filter_usage(usage) for name, usage in values["Views"].items()}
+
+        return filtered_values
+
+
+class SMTPPool:
+    def __init__(self, email, size=1):
+        self.email = email
+        self.size = size
+        self.connections = []
+        self.stacks = {}
+        self.created = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def connect(self):
+        # Connect using the perfect level of encryption.
+        stack = contextlib.ExitStack()
+        if self.email.encryption == EmailEncryption.IMPLICIT:
+            server = stack.enter_context(smtplib.SMTP_SSL(host=self.email.server_address, port=self.email.server_port))
+        else:
+            server = stack.enter_context(smtplib.SMTP(host=self.email.server_address, port=self.email.server_port))
+            if self.email.encryption == EmailEncryption.EXPLICIT:
+                server.starttls()
+
+        server.login(self.email.username, self.email.password)
+        self.stacks[id(server)] = stack
+        return server
+
+    def disconnect(self, server):
+        try:
+            self.stacks.pop(id(server)).close()
+        except (smtplib.SMTPException, OSError) as e:
+            logging.debug(f"Failed to disconnect from SMTP server: {e}")
+
+    def acquire(self):
+        # Reuse an idle connection, or open a new one as long as the pool is not full. Otherwise wait for a connection
+        # to be returned, or for a failed connection to make room for a new one.
+        with self.condition:
+            while len(self.connections) == 0 and self.created >= self.size:
+                self.condition.wait()
+
+            if len(self.connections) > 0:
+                return self.connections.pop()
+
+            self.created += 1
+
+        try:
+            return self.connect()
+        except Exception:
+            self.release()
+            raise
+
+    def put(self, server):
+        with self.condition:
+            self.connections.append(server)
+            self.condition.notify()
+
+    def release(self):
+        # Wake a waiting sender, which then tries to connect on its own (and fails just the same if the server is down).
+        with self.condition:
+            self.created -= 1
+            self.condition.notify()
+
+    def send(self, msg):
+        server = self.acquire()
+        try:
+            try:
+                server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+                # The connection was lost, reconnect and try once more.
+                logging.info(f"Reconnecting to SMTP server after failure: {e}")
+                zmetrics.count("retries")
+                self.disconnect(server)
+                server = None
+                server = self.connect()
+                server.send_message(msg)
+
+            zmetrics.count("emails_sent")
+        finally:
+            if server is not None:
+                self.put(server)
+            else:
+                self.release()
+
+    def close(self):
+        with self.condition:
+            connections, self.connections = self.connections, []
+
+        for server in connections:
+            self.disconnect(server)
+
+
 class Email:
     def __init__(
         self,
@@ -28,6 +165,8 @@ class Email:
         to=list(),
         cc=list(),
         bcc=list(),
+        recipients=list(),
+        connections=1,
     ):
         self.server_address = server_address
         self.server_port = server_port
@@ -35,55 +174,86 @@ class Email:
         self.username = username
         self.password = password
         self.from_email = from_email
-        self.subject = subject
-        self.text = text
-        self.html = html
-        self.filename = filename
         self.to = to
         self.cc = cc
         self.bcc = bcc
+        self.recipients = recipients
+        self.connections = connections
 
-    def send(self, values, buffer):
+        # Compile templates up front, so that syntax errors are found before any report is generated.
+        self.subject = ztemplates.compile_template(subject, "email subject")
+        self.text = ztemplates.compile_template(text, "email text") if text is not None else None
+        self.html = ztemplates.compile_template(html, "email html") if html is not None else None
+        self.filename = ztemplates.compile_template(filename, "email filename") if filename is not None else None
+
+    def message(self, values, report, recipient):
         msg = EmailMessage()
-        msg["Subject"] = jinja.Template(self.subject).render(values)
+        msg["Subject"] = self.subject.render(values)
         msg["From"] = formataddr(self.from_email)
 
         # Add recipients.
-        if len(self.to) > 0:
-            msg["To"] = ", ".join(self.to)
+        if len(recipient.to) > 0:
+            msg["To"] = ", ".join(recipient.to)
 
-        if len(self.cc) > 0:
-            msg["Cc"] = ", ".join(self.cc)
+        if len(recipient.cc) > 0:
+            msg["Cc"] = ", ".join(recipient.cc)
 
-        if len(self.bcc) > 0:
-            msg["Bcc"] = ", ".join(self.bcc)
+        if len(recipient.bcc) > 0:
+            msg["Bcc"] = ", ".join(recipient.bcc)
 
         # Add body.
         if self.text is not None:
-            msg.set_content(jinja.Template(self.text).render(values))
+            msg.set_content(self.text.render(values))
 
         if self.html is not None:
-            msg.add_alternative(jinja.Template(self.html).render(values), subtype="html")
+            msg.add_alternative(self.html.render(values), subtype="html")
 
-        # Add charge report attachment.
+        # Add charge report attachment, encoded straight from a view of the report.
         if self.filename is not None:
             msg.add_attachment(
-                buffer.getbuffer().tobytes(),
+                report,
                 maintype="application",
                 subtype="vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                filename=jinja.Template(self.filename).render(values),
+                filename=self.filename.render(values),
             )
 
-        # Send using the perfect level of encryption.
+        return msg
+
+    def send(self, values, report):
+        recipient = Recipient(self.to, self.cc, self.bcc)
+        msg = self.message(values, report, recipient)
+
         logging.info(f"Sending email to {len(self.to) + len(self.cc) + len(self.bcc)} recipients.")
-        if self.encryption == EmailEncryption.IMPLICIT:
-            with smtplib.SMTP_SSL(host=self.server_address, port=self.server_port) as server:
-                server.login(self.username, self.password)
-                server.send_message(msg)
-        else:
-            with smtplib.SMTP(host=self.server_address, port=self.server_port) as server:
-                if self.encryption == EmailEncryption.EXPLICIT:
-                    server.starttls()
+        with SMTPPool(self) as pool:
+            pool.send(msg)
 
-                server.login(self.username, self.password)
-                server.send_message(msg)
+    def send_personalized(self, values, render, workers=1):
+        # Filter usage down to what belongs to each recipient, and render all of their reports in one go.
+        recipient_values = [recipient.filter_values(values) for recipient in self.recipients]
+        buffers = render(recipient_values) if self.filename is not None else [None] * len(self.recipients)
+
+        def deliver(recipient, filtered_values, buffer):
+            with zsinks.report_view(buffer) as report:
+                msg = self.message(filtered_values, report, recipient)
+
+            pool.send(msg)
+
+        logging.info(f"Sending personalized emails to {len(self.recipients)} recipients.")
+        with SMTPPool(self, self.connections) as pool:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    recipient: executor.submit(deliver, recipient, filtered_values, buffer)
+                    for recipient, filtered_values, buffer in zip(self.recipients, recipient_values, buffers)
+                }
+
+        # Report all recipients that could not be reached, after trying to reach everyone else.
+        errors = {}
+        for recipient, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Failed to send email to {recipient}: {e}")
+                errors[str(recipient)] = e
+
+        if len(errors) > 0:
+            raise EmailError(errors)
@@ -0,0 +1,87 @@
+import io
+from datetime import datetime
+
+from zaptec_reporter import usage as zusage
+
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+MAX_COLUMN_WIDTH = 255
+
+
+class UsageWorksheet:
+    def __init__(self, workbook, sheet_name):
+        from xlsxwriter.utility import xl_pixel_width
+
+        self.worksheet = workbook.add_worksheet(sheet_name)
+        self.datetime_format = workbook.add_format({"num_format": DATETIME_FORMAT})
+        self.header_format = workbook.add_format(HEADER_FORMAT)
+        self.xl_pixel_width = xl_pixel_width
+        self.pixel_widths = {}
+        self.row = 0
+
+    def fit(self, col, pixels):
+        if pixels > self.pixel_widths.get(col, 0):
+            self.pixel_widths[col] = pixels
+
+    def write_row(self, values, cell_format=None):
+        # Write cells one row at a time, and keep track of column widths while doing so (just like autofit would).
+        for col, value in enumerate(values):
+            if value is None or value != value:
+                continue
+            elif isinstance(value, str):
+                self.worksheet.write_string(self.row, col, value, cell_format)
+                self.fit(col, self.xl_pixel_width(value))
+            elif isinstance(value, datetime):
+                self.worksheet.write_datetime(self.row, col, value, self.datetime_format)
+                self.fit(col, self.worksheet.default_date_pixels)
+            elif isinstance(value, bool):
+                self.worksheet.write_boolean(self.row, col, value, cell_format)
+                self.fit(col, 31 if value else 36)
+            else:
+                # Floats are rounded to two decimals, just like pandas does with float_format="%.2f".
+                number = float(f"{value:.2f}") if isinstance(value, float) else value
+                self.worksheet.write_number(self.row, col, number, cell_format)
+                self.fit(col, 7 * len(str(number)))
+
+        self.row += 1
+
+    def skip_row(self):
+        self.row += 1
+
+    def autofit(self):
+        for col, pixels in self.pixel_widths.items():
+            # Convert pixels to character width, with 7 pixels of padding like Excel.
+            pixels += 7
+            width = pixels / 12 if pixels <= 12 else (pixels - 5) / 7
+            self.worksheet.set_column(col, col, min(width, MAX_COLUMN_WIDTH))
+
+
+def create_excel_usage_report(data):
+    import xlsxwriter
+
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+    if "Generated" in data["Metadata"]:
+        # Date the workbook by the report, so that the same report always renders the same workbook.
+        workbook.set_properties({"created": data["Metadata"]["Generated"]})
+
+    # Every view of the usage gets a sheet of its own.
+    for sheet_name, usage in data.get("Views", {"Report": data["Usage"]}).items():
+        worksheet = UsageWorksheet(workbook, sheet_name)
+
+        # Write metadata.
+        for key, value in data["Metadata"].items():
+            worksheet.write_row((key, value))
+
+        # Write usage, separated from metadata by a blank row.
+        worksheet.skip_row()
+        columns, rows = zusage.usage_table(usage)
+        worksheet.write_row(columns, worksheet.header_format)
+        for row in rows:
+            worksheet.write_row(row)
+
+        worksheet.autofit()
+
+    workbook.close()
+
+    return buffer
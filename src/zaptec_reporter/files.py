@@ -0,0 +1,18 @@
+import os
+import pathlib
+import threading
+
+
+def write_atomic(path, data, private=False):
+    # Write to a temporary file and move it into place, so that readers never see partial files. Private files (and
+    # their directories) are only ever accessible by the current user, also while being written.
+    path = pathlib.Path(path)
+    path.parent.mkdir(mode=0o700 if private else 0o777, parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600 if private else 0o666)
+    with os.fdopen(fd, "w" if isinstance(data, str) else "wb") as f:
+        f.write(data)
+
+    if private:
+        os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, path)
@@ -0,0 +1,158 @@
+import contextlib
+import json
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from zaptec_reporter import files as zfiles
+
+COUNTERS = {
+    "retries": "Requests retried after a rejected access token or a lost connection.",
+    "report_cache_hits": "Installation reports read from the report cache.",
+    "report_cache_misses": "Installation reports not found in the report cache.",
+    "usage_store_hits": "Installation reports read from the usage store.",
+    "emails_sent": "Emails sent.",
+}
+
+# Metrics are only recorded once enabled, everything else is a cheap no-op.
+enabled = False
+json_path = None
+textfile_path = None
+listeners = []
+phases = {}
+requests = {}
+counters = dict.fromkeys(COUNTERS, 0)
+lock = threading.Lock()
+
+
+def configure(json_file=None, textfile=None):
+    global enabled, json_path, textfile_path
+    enabled = json_file is not None or textfile is not None or len(listeners) > 0
+    json_path = json_file
+    textfile_path = textfile
+    with lock:
+        phases.clear()
+        requests.clear()
+        counters.update(dict.fromkeys(COUNTERS, 0))
+
+
+def add_listener(listener):
+    # Listeners are called at the start and end of every phase, such as to take memory snapshots.
+    global enabled
+    listeners.append(listener)
+    enabled = True
+
+
+def remove_listener(listener):
+    global enabled
+    listeners.remove(listener)
+    enabled = json_path is not None or textfile_path is not None or len(listeners) > 0
+
+
+@contextlib.contextmanager
+def phase(name):
+    if not enabled:
+        yield
+        return
+
+    for listener in listeners:
+        listener(name, "start")
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with lock:
+            phases[name] = phases.get(name, 0.0) + elapsed
+
+        for listener in listeners:
+            listener(name, "end")
+
+
+def count(name, amount=1):
+    if enabled:
+        with lock:
+            counters[name] += amount
+
+
+def observe_response(response, *args, **kwargs):
+    # Session response hook, recording the latency of every request by endpoint and status.
+    key = (response.request.method, urlsplit(response.request.url).path, response.status_code)
+    elapsed = response.elapsed.total_seconds()
+    with lock:
+        observed = requests.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+        observed["count"] += 1
+        observed["sum"] += elapsed
+        observed["max"] = max(observed["max"], elapsed)
+
+
+def summary(success=True):
+    with lock:
+        return {
+            "finished_at": datetime.now().isoformat(),
+            "success": success,
+            "phases": dict(phases),
+            "requests": [
+                {"method": method, "endpoint": endpoint, "status": status, **observed}
+                for (method, endpoint, status), observed in requests.items()
+            ],
+            "counters": dict(counters),
+        }
+
+
+def prometheus(summary):
+    lines = [
+        "# HELP zaptec_reporter_last_run_timestamp_seconds Time at which the last run ended.",
+        "# TYPE zaptec_reporter_last_run_timestamp_seconds gauge",
+        f"zaptec_reporter_last_run_timestamp_seconds {datetime.fromisoformat(summary['finished_at']).timestamp()}",
+        "# HELP zaptec_reporter_last_run_success Whether the last run succeeded.",
+        "# TYPE zaptec_reporter_last_run_success gauge",
+        f"zaptec_reporter_last_run_success {int(summary['success'])}",
+        "# HELP zaptec_reporter_phase_seconds_total Time spent in each phase.",
+        "# TYPE zaptec_reporter_phase_seconds_total counter",
+    ]
+    lines += [f'zaptec_reporter_phase_seconds_total{{phase="{name}"}} {s}' for name, s in summary["phases"].items()]
+
+    lines += [
+        "# HELP zaptec_reporter_http_request_duration_seconds Latency of HTTP requests to Zaptec Cloud.",
+        "# TYPE zaptec_reporter_http_request_duration_seconds summary",
+    ]
+    for observed in summary["requests"]:
+        labels = f'method="{observed["method"]}",endpoint="{observed["endpoint"]}",status="{observed["status"]}"'
+        lines.append(f"zaptec_reporter_http_request_duration_seconds_sum{{{labels}}} {observed['sum']}")
+        lines.append(f"zaptec_reporter_http_request_duration_seconds_count{{{labels}}} {observed['count']}")
+
+    for name, description in COUNTERS.items():
+        lines += [
+            f"# HELP zaptec_reporter_{name}_total {description}",
+            f"# TYPE zaptec_reporter_{name}_total counter",
+            f"zaptec_reporter_{name}_total {summary['counters'][name]}",
+        ]
+
+    return "\n".join(lines) + "\n"
+
+
+def write(success=True):
+    if json_path is None and textfile_path is None:
+        return
+
+    # Collectors never read partial files.
+    run_summary = summary(success)
+    if json_path is not None:
+        zfiles.write_atomic(json_path, json.dumps(run_summary, indent=2) + "\n")
+
+    if textfile_path is not None:
+        zfiles.write_atomic(textfile_path, prometheus(run_summary))
+
+
+@contextlib.contextmanager
+def recording():
+    # Write metrics when the run ends, also when it fails.
+    success = False
+    try:
+        yield
+        success = True
+    finally:
+        write(success)
@@ -0,0 +1,89 @@
+import cProfile
+import io
+import logging
+import pathlib
+import pstats
+import threading
+import tracemalloc
+
+from zaptec_reporter import metrics as zmetrics
+
+# Allocations made by tracemalloc itself are left out of memory statistics.
+IGNORED_FILENAMES = {tracemalloc.__file__, "<unknown>"}
+
+
+def format_size(size):
+    return f"{size / 1024 / 1024:.1f} MiB" if abs(size) >= 1024 * 1024 else f"{size / 1024:.1f} KiB"
+
+
+class Profiler:
+    def __init__(self, path, top=25):
+        self.path = pathlib.Path(path)
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.snapshots = 0
+        self.started = {}
+        self.memory = io.StringIO()
+
+    def __enter__(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        tracemalloc.start()
+        zmetrics.add_listener(self.boundary)
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.profile.disable()
+        zmetrics.remove_listener(self.boundary)
+        tracemalloc.stop()
+        self.report()
+
+    def snapshot(self, name, event):
+        # Snapshots are dumped as they are taken, and may be compared later with tracemalloc.Snapshot.load().
+        snapshot = tracemalloc.take_snapshot()
+        self.snapshots += 1
+        snapshot.dump(self.path / f"{self.snapshots:02d}-{name}-{event}.snapshot")
+        return snapshot
+
+    def boundary(self, name, event):
+        # Taking snapshots is slow, and is kept out of the profile.
+        self.profile.disable()
+        try:
+            # Phases are told apart by thread too, so that phases of other threads never end the phase of this one.
+            key = (threading.get_ident(), name)
+            if "start" == event:
+                tracemalloc.reset_peak()
+                self.started[key] = self.snapshot(name, event)
+            else:
+                _, peak = tracemalloc.get_traced_memory()
+                start = self.started.pop(key)
+                end = self.snapshot(name, event)
+                self.write_memory(name, start, end, peak)
+        finally:
+            self.profile.enable()
+
+    def write_memory(self, name, start, end, peak):
+        statistics = [
+            statistic
+            for statistic in end.compare_to(start, "lineno")
+            if statistic.traceback[0].filename not in IGNORED_FILENAMES
+        ]
+        growth = sum(statistic.size_diff for statistic in statistics)
+        logging.info(f"Phase {name} retained {format_size(growth)} of memory, at a peak of {format_size(peak)}.")
+        print(f"{name}: {format_size(growth)} retained, {format_size(peak)} peak", file=self.memory)
+        for statistic in statistics[: self.top]:
+            if statistic.size_diff != 0:
+                print(f"    {statistic}", file=self.memory)
+
+    def report(self):
+        self.profile.dump_stats(self.path / "profile.pstats")
+
+        # Summarize the hottest functions, by time spent in them and below them.
+        summary = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=summary).strip_dirs()
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        (self.path / "profile.txt").write_text(summary.getvalue())
+        (self.path / "memory.txt").write_text(self.memory.getvalue())
+
+        logging.info(f"Wrote profile and memory snapshots to {self.path}.")
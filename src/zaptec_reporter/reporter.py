@@ -1,31 +1,110 @@
 import argparse
-import dateparser
+import concurrent.futures
+import contextlib
+import functools
 import io
+import itertools
 import logging
-import pandas as pd
+import math
 import pathlib
+import re
+import signal
 import sys
-import yaml
-import jinja2 as jinja
-from datetime import datetime
-from email_validator import validate_email
+from datetime import datetime, timedelta
 
 from zaptec_reporter import api as zapi
+from zaptec_reporter import cache as zcache
 from zaptec_reporter import email as zemail
+from zaptec_reporter import excel as zexcel
+from zaptec_reporter import metrics as zmetrics
+from zaptec_reporter import schedule as zschedule
+from zaptec_reporter import sinks as zsinks
+from zaptec_reporter import templates as ztemplates
+from zaptec_reporter import usage as zusage
+
+# Heavy dependencies (dateparser, pandas, jinja2, yaml and email_validator) are imported where they are used, so that
+# commands which do not need them start quickly.
+
+ABSOLUTE_DATE_PATTERN = re.compile(r"^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$")
+RELATIVE_DATE_PATTERN = re.compile(r"^(?:(this|last|next) (week|month|year)|(\d+) (day|week|month|year)s? ago)$")
+RELATIVE_DAYS = {"today": 0, "now": 0, "yesterday": -1, "tomorrow": 1}
+RELATIVE_AMOUNTS = {"this": 0, "last": -1, "next": 1}
+
+
+@functools.cache
+def date_data_parser():
+    import dateparser
+
+    return dateparser.DateDataParser(settings={"PREFER_DAY_OF_MONTH": "first", "RETURN_TIME_AS_PERIOD": True})
+
+
+def shift_date(date, period, amount):
+    if period == "year":
+        return date.replace(year=date.year + amount, month=1, day=1)
+    elif period == "month":
+        months = date.year * 12 + date.month - 1 + amount
+        return date.replace(year=months // 12, month=months % 12 + 1, day=1)
+    elif period == "week":
+        return date + timedelta(weeks=amount)
+    else:
+        return date + timedelta(days=amount)
+
+
+def parse_date_fast(date):
+    normalized = " ".join(date.lower().split())
+
+    # Dates such as "2024", "2024-5" and "2024-05-30".
+    match = ABSOLUTE_DATE_PATTERN.match(normalized)
+    if match is not None:
+        year, month, day = match.groups()
+        try:
+            if day is not None:
+                return datetime(int(year), int(month), int(day)), "day"
+            elif month is not None:
+                return datetime(int(year), int(month), 1), "month"
+            else:
+                return datetime(int(year), 1, 1), "year"
+        except ValueError:
+            return None
+
+    # Relative dates such as "today", "last month" and "2 years ago".
+    if normalized in RELATIVE_DAYS:
+        return shift_date(datetime.now(), "day", RELATIVE_DAYS[normalized]), "day"
+
+    match = RELATIVE_DATE_PATTERN.match(normalized)
+    if match is not None:
+        relative, period, amount, amount_period = match.groups()
+        if relative is not None:
+            return shift_date(datetime.now(), period, RELATIVE_AMOUNTS[relative]), period
+        else:
+            return shift_date(datetime.now(), amount_period, -int(amount)), amount_period
+
+    # ISO dates with time, such as "2024-12-01T10:30:00".
+    try:
+        date_obj = datetime.fromisoformat(date.strip())
+        if date_obj.tzinfo is None:
+            return date_obj, "time"
+    except ValueError:
+        pass
+
+    return None
 
 
 def parse_date_arg(date):
-    ddp = dateparser.DateDataParser(settings={"PREFER_DAY_OF_MONTH": "first", "RETURN_TIME_AS_PERIOD": True})
-    date_data = ddp.get_date_data(date)
-    date_obj = date_data.date_obj
+    # Parse common dates directly, and only fall back to dateparser for free-form dates.
+    date_data = parse_date_fast(date)
+    if date_data is None:
+        date_data = date_data_parser().get_date_data(date)
+        date_data = (date_data.date_obj, date_data.period)
 
+    date_obj, period = date_data
     if date_obj is None:
         raise ValueError(f"{date} is not a valid date.")
 
     # Truncate specified date down to beginning of period.
-    if date_data.period == "year":
+    if period == "year":
         date_obj = date_obj.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    elif date_data.period == "month":
+    elif period == "month":
         date_obj = date_obj.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     else:
         date_obj = date_obj.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -33,49 +112,205 @@ def parse_date_arg(date):
     return date_obj
 
 
+def check_date_range(from_date, to_date):
+    if from_date >= to_date:
+        raise ValueError(f"From date {from_date:%Y-%m-%d} must be before to date {to_date:%Y-%m-%d}.")
+
+
+def positive_int_arg(value):
+    number = int(value)
+    if number < 1:
+        raise ValueError(f"{value} is not a positive integer.")
+
+    return number
+
+
 def create_excel_usage_report(data):
-    sheet_name = "Report"
-    df_usage = pd.DataFrame(data["Usage"])
+    import pandas as pd
+
     df_meta = pd.DataFrame([(key, value) for key, value in data["Metadata"].items()])
 
     buffer = io.BytesIO()
     with pd.ExcelWriter(buffer, engine="xlsxwriter", datetime_format="yyyy-mm-dd hh:mm:ss") as writer:
-        df_meta.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
-        df_usage.to_excel(
-            writer,
-            sheet_name=sheet_name,
-            startrow=len(df_meta) + 1,
-            index=False,
-            float_format="%.2f",
-        )
+        if "Generated" in data["Metadata"]:
+            # Use the report time as creation time, which makes rendering reproducible.
+            writer.book.set_properties({"created": data["Metadata"]["Generated"]})
 
-        # Autofit columns.
-        worksheet = writer.sheets[sheet_name]
-        worksheet.autofit()
+        # Every view of the usage gets a sheet of its own.
+        for sheet_name, usage in data.get("Views", {"Report": data["Usage"]}).items():
+            columns, rows = zusage.usage_table(usage)
+            df_usage = pd.DataFrame(rows, columns=columns)
+            df_meta.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+            df_usage.to_excel(
+                writer,
+                sheet_name=sheet_name,
+                startrow=len(df_meta) + 1,
+                index=False,
+                float_format="%.2f",
+            )
+
+            # Autofit columns.
+            worksheet = writer.sheets[sheet_name]
+            worksheet.autofit()
 
     return buffer
 
 
-def fetch_usage_data(api, installation_ids, date_from, date_to, group_by=zapi.InstallationGroupBy.CHARGER):
-    # Fetch reports from all installations.
-    installation_reports = [
-        api.fetch_installation_report(installation_id, date_from.isoformat(), date_to.isoformat())
-        for installation_id in installation_ids
-    ]
+class FetchError(Exception):
+    def __init__(self, reports, errors, usage_data=None):
+        self.reports = reports
+        self.errors = errors
+        self.usage_data = usage_data
+        failed = ", ".join(f"{installation_id} ({error})" for installation_id, error in errors.items())
+        super().__init__(
+            f"Failed to fetch {len(errors)} of {len(reports) + len(errors)} installation reports: {failed}"
+        )
+
+
+def split_months(date_from, date_to):
+    # Split date range into calendar months. Dates are local to the installation, and so are the months.
+    chunks = []
+    chunk_from = date_from
+    while chunk_from < date_to:
+        chunk_to = min(datetime(chunk_from.year + chunk_from.month // 12, chunk_from.month % 12 + 1, 1), date_to)
+        chunks.append((chunk_from, chunk_to))
+        chunk_from = chunk_to
+
+    return chunks
+
 
-    # Aggregate usage data in human readable format.
-    usage = []
-    for report in installation_reports:
+def merge_installation_reports(reports):
+    # Sum usage per group, in the order in which the groups first appear.
+    groups = {}
+    for report in reports:
         for entry in report["totalUserChargerReportModel"]:
-            usage.append(
-                {
-                    report["GroupedBy"]: entry["GroupAsString"],
-                    "Energy": entry["TotalChargeSessionEnergy"],
-                    "Duration": str(pd.Timedelta(hours=entry["TotalChargeSessionDuration"]).round("s")),
-                    "Sessions": entry["TotalChargeSessionCount"],
-                    "Installation": report["InstallationName"],
-                }
+            group = groups.setdefault(entry["GroupAsString"], {"Count": [], "Energy": [], "Duration": []})
+            group["Count"].append(entry["TotalChargeSessionCount"])
+            group["Energy"].append(entry["TotalChargeSessionEnergy"])
+            group["Duration"].append(entry["TotalChargeSessionDuration"])
+
+    return {
+        **reports[0],
+        "Enddate": reports[-1]["Enddate"],
+        "totalUserChargerReportModel": [
+            {
+                "GroupAsString": name,
+                "TotalChargeSessionCount": sum(group["Count"]),
+                "TotalChargeSessionEnergy": math.fsum(group["Energy"]),
+                "TotalChargeSessionDuration": math.fsum(group["Duration"]),
+            }
+            for name, group in groups.items()
+        ],
+    }
+
+
+def plan_fetches(installation_ids, date_from, date_to, group_by, split_by_month=False, usage_store=None):
+    # Every installation report is made up of one or more (installation, from, to, group by) fetches.
+    chunks = split_months(date_from, date_to) if split_by_month else [(date_from, date_to)]
+    months = split_months(date_from, date_to)
+
+    plan = {}
+    for installation_id in installation_ids:
+        fetches = [
+            (installation_id, chunk_from.isoformat(), chunk_to.isoformat(), group_by) for chunk_from, chunk_to in chunks
+        ]
+
+        # Unless the usage store covers the whole period, use the stored months and only fetch the gaps.
+        if usage_store is not None and not all(usage_store.covers(*fetch) for fetch in fetches):
+            fetches = [
+                (installation_id, month_from.isoformat(), month_to.isoformat(), group_by)
+                for month_from, month_to in months
+            ]
+
+        plan[installation_id] = fetches
+
+    return plan
+
+
+def submit_fetches(executor, api, fetches):
+    # Submit every unique fetch once, no matter how many reports need it.
+    return {fetch: executor.submit(api.fetch_installation_report, *fetch) for fetch in dict.fromkeys(fetches)}
+
+
+def collect_installation_reports(plan, futures):
+    # Collect reports, and keep the successful ones even if some installations failed.
+    reports = {}
+    errors = {}
+    for installation_id, fetches in plan.items():
+        try:
+            chunk_reports = [futures[fetch].result() for fetch in fetches]
+            reports[installation_id] = (
+                merge_installation_reports(chunk_reports) if len(chunk_reports) > 1 else chunk_reports[0]
             )
+        except Exception as e:
+            logging.error(f"Failed to fetch installation report for {installation_id}: {e}")
+            errors[installation_id] = e
+
+    if len(errors) > 0:
+        raise FetchError(reports, errors)
+
+    return reports
+
+
+def group_by_list(group_by):
+    # One grouping, or several groupings to be fetched as views of the same usage.
+    return [group_by] if isinstance(group_by, zapi.InstallationGroupBy) else list(dict.fromkeys(group_by))
+
+
+def view_name(group_by):
+    return group_by.name.replace("_", " ").capitalize()
+
+
+def plan_views(installation_ids, date_from, date_to, group_by, split_by_month=False, usage_store=None):
+    return {
+        view_group_by: plan_fetches(installation_ids, date_from, date_to, view_group_by, split_by_month, usage_store)
+        for view_group_by in group_by_list(group_by)
+    }
+
+
+def view_fetches(plans):
+    return [fetch for plan in plans.values() for fetches in plan.values() for fetch in fetches]
+
+
+def collect_usage_data(plans, futures):
+    view_reports = {}
+    errors = {}
+    for group_by, plan in plans.items():
+        try:
+            view_reports[group_by] = collect_installation_reports(plan, futures)
+        except FetchError as e:
+            view_reports[group_by] = e.reports
+            errors.update(e.errors)
+
+    # Installations that failed in any grouping are left out of all of them, so that every view adds up the same.
+    view_reports = {
+        group_by: {
+            installation_id: report for installation_id, report in reports.items() if installation_id not in errors
+        }
+        for group_by, reports in view_reports.items()
+    }
+    fetched = next(iter(view_reports.values()))
+    if len(fetched) == 0:
+        raise FetchError(fetched, errors)
+
+    # Usage is that of the first grouping, and when there are several groupings all of them are kept as views.
+    views = {group_by: assemble_usage_data(list(reports.values())) for group_by, reports in view_reports.items()}
+    usage_data = next(iter(views.values()))
+    if len(views) > 1:
+        usage_data["Views"] = {view_name(group_by): view_data["Usage"] for group_by, view_data in views.items()}
+
+    # Usage of the installations that were fetched is kept with the error, listing the installations that failed.
+    if len(errors) > 0:
+        usage_data["Metadata"]["Failed"] = ", ".join(errors)
+        raise FetchError(fetched, errors, usage_data)
+
+    return usage_data
+
+
+def assemble_usage_data(installation_reports):
+    # Aggregate usage data into columns.
+    with zmetrics.phase("aggregate"):
+        usage = zusage.aggregate_usage(installation_reports)
 
     # Assemble metadata.
     report = installation_reports[0]
@@ -89,21 +324,343 @@ def fetch_usage_data(api, installation_ids, date_from, date_to, group_by=zapi.In
     return {"Usage": usage, "Metadata": metadata}
 
 
-def report(api, installations, from_date, to_date, excel_path, email):
-    usage_data = fetch_usage_data(api, installations, from_date, to_date)
-    buffer = create_excel_usage_report(usage_data)
+def fetch_usage_data(
+    api,
+    installation_ids,
+    date_from,
+    date_to,
+    group_by=zapi.InstallationGroupBy.CHARGER,
+    concurrency=1,
+    split_by_month=False,
+):
+    plans = plan_views(installation_ids, date_from, date_to, group_by, split_by_month, api.usage_store)
+
+    # Fetch reports from all installations, for every grouping, concurrently over the same session. Reports are kept in
+    # the order of the installation IDs.
+    with zmetrics.phase("fetch"), concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = submit_fetches(executor, api, view_fetches(plans))
+
+    return collect_usage_data(plans, futures)
+
+
+GROUP_BY_CHOICES = [name.lower().replace("_", "-") for name in zapi.InstallationGroupBy.__members__]
+
+EXCEL_WRITERS = {
+    "pandas": create_excel_usage_report,
+    "streaming": zexcel.create_excel_usage_report,
+}
+
+
+def render_excel_report(excel_writer, data):
+    # Workbooks are returned as bytes, which are cheap to send back from worker processes.
+    return EXCEL_WRITERS[excel_writer](data).getvalue()
+
+
+def render_excel_reports(datasets, excel_writer="pandas", workers=1):
+    if workers <= 1 or len(datasets) <= 1:
+        return [EXCEL_WRITERS[excel_writer](data) for data in datasets]
+
+    # Rendering workbooks is CPU bound, so render them in worker processes when there are many of them.
+    logging.info(f"Rendering {len(datasets)} usage reports in {min(workers, len(datasets))} processes.")
+    # Worker processes are not forked from this (threaded) process, but started fresh from a fork server.
+    import multiprocessing
+
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(workers, len(datasets)), mp_context=multiprocessing.get_context(start_method)
+    ) as executor:
+        return [
+            io.BytesIO(content)
+            for content in executor.map(render_excel_report, itertools.repeat(excel_writer), datasets)
+        ]
 
+
+def report(
+    api,
+    installations,
+    from_date,
+    to_date,
+    excel_path,
+    email,
+    concurrency=1,
+    split_by_month=False,
+    excel_writer="pandas",
+    output_paths=(),
+    output_format=None,
+    render_workers=1,
+    archive_path=None,
+    group_by=zapi.InstallationGroupBy.CHARGER,
+):
+    try:
+        usage_data = fetch_usage_data(
+            api, installations, from_date, to_date, group_by, concurrency=concurrency, split_by_month=split_by_month
+        )
+    except FetchError as e:
+        if e.usage_data is None:
+            raise
+
+        # Write the usage of the installations that were fetched, but never email or archive an incomplete report.
+        logging.warning(f"Writing partial usage report, without {len(e.errors)} failed installations.")
+        write_report(
+            e.usage_data, excel_path, None, concurrency, excel_writer, output_paths, output_format, render_workers
+        )
+        raise
+
+    write_report(
+        usage_data,
+        excel_path,
+        email,
+        concurrency,
+        excel_writer,
+        output_paths,
+        output_format,
+        render_workers,
+        archive_path=archive_path,
+    )
+
+
+def write_excel_file(excel_path, usage_data, report):
+    path = ztemplates.render(excel_path, usage_data, "excel path")
+    logging.info(f"Writing usage report to file {path}.")
+    zsinks.write_report_file(report, path)
+
+
+def archive_excel_report(archive_path, usage_data, report):
+    path = zsinks.archive_report(report, archive_path, usage_data["Metadata"])
+    logging.info(f"Archived usage report as {path}.")
+
+
+def report_sinks(excel_path, email, archive_path=None):
+    # Every sink of the full Excel report, by phase. Sinks are given the usage data and a read-only view of the report.
+    sinks = []
     if excel_path is not None:
-        # Write usage report to file.
-        path = jinja.Template(excel_path).render(usage_data)
-        logging.info(f"Writing usage report to file {path}.")
-        pathlib.Path(path).write_bytes(buffer.getbuffer().tobytes())
+        sinks.append(("write", functools.partial(write_excel_file, excel_path)))
+
+    if archive_path is not None:
+        sinks.append(("write", functools.partial(archive_excel_report, archive_path)))
+
+    if email is not None and len(email.to) + len(email.cc) + len(email.bcc) > 0:
+        sinks.append(("email", email.send))
+
+    return sinks
+
+
+def needs_excel_report(excel_path, email, archive_path=None):
+    # The full Excel report is only rendered if it is written to file, archived or sent to the direct email recipients.
+    return len(report_sinks(excel_path, email, archive_path)) > 0
+
+
+def write_report(
+    usage_data,
+    excel_path,
+    email,
+    concurrency=1,
+    excel_writer="pandas",
+    output_paths=(),
+    output_format=None,
+    render_workers=1,
+    buffer=None,
+    archive_path=None,
+):
+    for output_path in output_paths:
+        # Write usage to file in a machine readable format.
+        path = ztemplates.render(output_path, usage_data, "output path")
+        logging.info(f"Writing usage to file {path}.")
+        with zmetrics.phase("write"):
+            zsinks.write_usage(usage_data, path, output_format)
+
+    # Only render the full Excel report if something needs it, and it has not been rendered already.
+    sinks = report_sinks(excel_path, email, archive_path)
+    if buffer is None and len(sinks) > 0:
+        with zmetrics.phase("render"):
+            buffer = EXCEL_WRITERS[excel_writer](usage_data)
+
+    # The report is rendered once, and every sink reads from the same buffer.
+    with zsinks.report_view(buffer) as report:
+        for phase, sink in sinks:
+            with zmetrics.phase(phase):
+                sink(usage_data, report)
+
+    if email is not None and len(email.recipients) > 0:
+        # Send personalized reports, rendered per recipient.
+        render = functools.partial(render_excel_reports, excel_writer=excel_writer, workers=render_workers)
+        with zmetrics.phase("email"):
+            email.send_personalized(usage_data, render, concurrency)
+
+
+class BatchError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        failed = ", ".join(f"{name} ({error})" for name, error in errors.items())
+        super().__init__(f"Failed to run {len(errors)} batch jobs: {failed}")
+
+
+class BatchJob:
+    def __init__(
+        self,
+        name,
+        installations,
+        from_date,
+        to_date,
+        group_by=zapi.InstallationGroupBy.CHARGER,
+        split_by_month=False,
+        all_installations=False,
+        excel_path=None,
+        excel_writer="pandas",
+        output_paths=(),
+        output_format=None,
+        email=None,
+        schedule=None,
+        archive_path=None,
+    ):
+        self.name = name
+        self.installations = installations
+        self.from_date = from_date
+        self.to_date = to_date
+        self.group_by = group_by
+        self.split_by_month = split_by_month
+        self.all_installations = all_installations
+        self.excel_path = excel_path
+        self.excel_writer = excel_writer
+        self.output_paths = output_paths
+        self.output_format = output_format
+        self.email = email
+        self.schedule = schedule
+        self.archive_path = archive_path
+
+    def plan(self, all_installations=(), usage_store=None):
+        installations = self.installations
+        if self.all_installations:
+            installations = list(dict.fromkeys([*installations, *all_installations]))
+
+        # Relative dates, such as "last month", are given as text and resolved whenever the job is run.
+        from_date = parse_date_arg(self.from_date) if isinstance(self.from_date, str) else self.from_date
+        to_date = parse_date_arg(self.to_date) if isinstance(self.to_date, str) else self.to_date
+        check_date_range(from_date, to_date)
+        return plan_views(installations, from_date, to_date, self.group_by, self.split_by_month, usage_store)
+
+
+def batch(api, jobs, concurrency=1, render_workers=1):
+    # Resolve all installations once, for all jobs that need them.
+    all_installations = []
+    if any(job.all_installations for job in jobs):
+        all_installations = api.fetch_installation_ids(concurrency=concurrency)
+
+    # Plan all jobs up front, so that fetches shared between jobs are only made once.
+    errors = {}
+    planned = []
+    for job in jobs:
+        try:
+            planned.append((job, job.plan(all_installations, api.usage_store)))
+        except Exception as e:
+            logging.error(f"Failed to run batch job {job.name}: {e}")
+            errors[job.name] = e
+
+    fetches = [fetch for _, plan in planned for fetch in view_fetches(plan)]
+    unique_fetches = list(dict.fromkeys(fetches))
+    logging.info(f"Running {len(jobs)} jobs with {len(unique_fetches)} unique fetches ({len(fetches)} requested).")
+
+    # Collect usage for every job, and keep going if the reports of some jobs could not be fetched.
+    with zmetrics.phase("fetch"), concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = submit_fetches(executor, api, unique_fetches)
+
+    ready = []
+    for job, plan in planned:
+        try:
+            ready.append((job, collect_usage_data(plan, futures)))
+        except Exception as e:
+            logging.error(f"Failed to run batch job {job.name}: {e}")
+            errors[job.name] = e
+
+    # Render the Excel reports of all jobs together, so that they may be rendered in parallel.
+    buffers = {}
+    for excel_writer in dict.fromkeys(job.excel_writer for job, _ in ready):
+        rendered = [
+            (job, usage_data)
+            for job, usage_data in ready
+            if job.excel_writer == excel_writer and needs_excel_report(job.excel_path, job.email, job.archive_path)
+        ]
+        datasets = [usage_data for _, usage_data in rendered]
+        try:
+            with zmetrics.phase("render"):
+                rendered_buffers = render_excel_reports(datasets, excel_writer, render_workers)
+        except Exception as e:
+            # Reports rendered together fail together, but the jobs of other writers still run.
+            for job, _ in rendered:
+                logging.error(f"Failed to run batch job {job.name}: {e}")
+                errors[job.name] = e
+            continue
+
+        for (job, _), buffer in zip(rendered, rendered_buffers):
+            buffers[id(job)] = buffer
+
+    for job, usage_data in ready:
+        if job.name in errors:
+            continue
+
+        try:
+            logging.info(f"Writing batch job {job.name}.")
+            write_report(
+                usage_data,
+                job.excel_path,
+                job.email,
+                concurrency,
+                job.excel_writer,
+                job.output_paths,
+                job.output_format,
+                render_workers,
+                buffers.get(id(job), None),
+                job.archive_path,
+            )
+        except Exception as e:
+            logging.error(f"Failed to run batch job {job.name}: {e}")
+            errors[job.name] = e
+
+    # Report all jobs that failed, after running every other job.
+    if len(errors) > 0:
+        raise BatchError(errors)
+
+
+def sessions(api, installations, from_date, to_date, output_path, output_format=None, concurrency=1, page_size=1000):
+    # Stream charge sessions from all installations straight to file, a few pages at a time.
+    metadata = {"Generated": datetime.now(), "From": from_date, "To": to_date}
+    path = ztemplates.render(output_path, {"Metadata": metadata}, "output path")
+    records = itertools.chain.from_iterable(
+        api.iter_charge_history(installation_id, from_date.isoformat(), to_date.isoformat(), page_size, concurrency)
+        for installation_id in installations
+    )
+
+    logging.info(f"Writing charge sessions to file {path}.")
+    with zmetrics.phase("sessions"):
+        zsinks.write_records(records, path, output_format, zapi.CHARGE_SESSION_FIELDS)
+
+
+def daemon(api, jobs, concurrency=1, render_workers=1):
+    def run(due):
+        try:
+            batch(api, due, concurrency, render_workers)
+        except BatchError:
+            # Failed jobs are already logged, and are tried again on their next run.
+            zmetrics.write(success=False)
+        except Exception as e:
+            # Keep the daemon running, such as when installations could not be fetched, and try again on the next run.
+            logging.error(f"Failed to run {len(due)} batch jobs: {e}")
+            zmetrics.write(success=False)
+        else:
+            zmetrics.write(success=True)
 
-    if email is not None:
-        email.send(usage_data, buffer)
+    # Finish the current run and shut down on SIGTERM (or Ctrl-C).
+    scheduler = zschedule.Scheduler([(job.schedule, job) for job in jobs])
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+
+    logging.info(f"Scheduling {len(jobs)} jobs.")
+    scheduler.run(run)
 
 
 def parse_email_addresses(config, key):
+    from email_validator import validate_email
+
     if key not in config:
         return list()
 
@@ -114,7 +671,38 @@ def parse_email_addresses(config, key):
     return addresses
 
 
+def parse_recipient_names(config, key):
+    if config.get(key, None) is None:
+        return None
+
+    # Names are matched exactly, so a single name must not be mistaken for a string of names.
+    names = config[key] if isinstance(config[key], list) else [config[key]]
+    for name in names:
+        if not isinstance(name, str):
+            raise ValueError(f"Recipient {key} must be names, got {name!r}.")
+
+    return names
+
+
+def parse_recipient(config):
+    recipient = zemail.Recipient(
+        parse_email_addresses(config, "to"),
+        parse_email_addresses(config, "cc"),
+        parse_email_addresses(config, "bcc"),
+        config.get("name", None),
+        parse_recipient_names(config, "chargers"),
+        parse_recipient_names(config, "installations"),
+    )
+    if len(recipient.to) + len(recipient.cc) + len(recipient.bcc) == 0:
+        raise ValueError(f"Recipient {recipient.name or ''} needs at least one to, cc or bcc address.")
+
+    return recipient
+
+
 def parse_email_config(email_path):
+    import yaml
+    from email_validator import validate_email
+
     # Read email config yaml file.
     with open(email_path, "r") as f:
         config = yaml.load(f, Loader=yaml.Loader)
@@ -149,6 +737,9 @@ def parse_email_config(email_path):
     if text is None and html is None:
         logging.warning("Email template does not contain a body.")
 
+    # Parse personalized recipients, each receiving usage from their own chargers and/or installations.
+    recipients = [parse_recipient(recipient) for recipient in config.get("recipients", list())]
+
     return zemail.Email(
         server_address,
         server_port,
@@ -163,9 +754,89 @@ def parse_email_config(email_path):
         to,
         cc,
         bcc,
+        recipients,
+        server_config.get("connections", 1),
     )
 
 
+def parse_batch_config(batch_path):
+    import yaml
+
+    # Read batch yaml file, a list of report jobs.
+    with open(batch_path, "r") as f:
+        config = yaml.load(f, Loader=yaml.Loader)
+
+    # Email configurations are parsed once, also when they are shared between jobs.
+    emails = {}
+    jobs = []
+    for i, job_config in enumerate(config):
+        name = job_config.get("name", f"job {i + 1}")
+        installations = job_config.get("installations", list())
+        installations = installations if isinstance(installations, list) else [installations]
+        all_installations = job_config.get("all-installations", False)
+        if not all_installations and len(installations) == 0:
+            raise ValueError(f"Batch job {name} needs at least one installation ID or all-installations.")
+
+        # Job options are named just like their report command counterparts.
+        output_paths = job_config.get("output", list())
+        output_paths = output_paths if isinstance(output_paths, list) else [output_paths]
+        excel_path = job_config.get("excelout", None)
+        for path in [excel_path, *output_paths]:
+            if path is not None:
+                ztemplates.compile_template(path, "output path")
+
+        excel_writer = job_config.get("excel-writer", "pandas")
+        if excel_writer not in EXCEL_WRITERS:
+            raise ValueError(f"Batch job {name} has unknown excel-writer {excel_writer}.")
+
+        output_format = job_config.get("output-format", None)
+        if output_format is not None:
+            output_format = zsinks.OutputFormat(output_format)
+
+        # Dates are validated here, but resolved when the job is run.
+        from_date = str(job_config.get("from-date", "last month"))
+        to_date = str(job_config.get("to-date", "this month"))
+        try:
+            check_date_range(parse_date_arg(from_date), parse_date_arg(to_date))
+        except ValueError as e:
+            raise ValueError(f"Batch job {name} has an invalid period: {e}") from e
+
+        schedule = job_config.get("schedule", None)
+        if schedule is not None:
+            schedule = zschedule.CronSchedule(schedule)
+
+        email_path = job_config.get("email", None)
+        if email_path is not None and email_path not in emails:
+            emails[email_path] = parse_email_config(email_path)
+
+        group_by = job_config.get("group-by", "charger")
+        group_by = [
+            zapi.InstallationGroupBy[name.upper().replace("-", "_")]
+            for name in (group_by if isinstance(group_by, list) else [group_by])
+        ]
+
+        jobs.append(
+            BatchJob(
+                name,
+                installations,
+                from_date,
+                to_date,
+                group_by,
+                job_config.get("split-months", False),
+                all_installations,
+                excel_path,
+                excel_writer,
+                output_paths,
+                output_format,
+                emails.get(email_path, None),
+                schedule,
+                job_config.get("archive", None),
+            )
+        )
+
+    return jobs
+
+
 def main(argv=sys.argv[1:]) -> None:
     # Setup argument parser.
     parser = argparse.ArgumentParser(description="Generate usage reports from Zaptec chargers.")
@@ -189,6 +860,66 @@ def main(argv=sys.argv[1:]) -> None:
         " If no username is provided then the password will be treated as an API access token.",
         required=True,
     )
+    parser.add_argument(
+        "--api-url",
+        help=f"Base URL of the Zaptec Cloud API. Defaults to {zapi.DEFAULT_BASE_URL}.",
+        default=zapi.DEFAULT_BASE_URL,
+    )
+    parser.add_argument(
+        "--token-cache",
+        help="File in which to cache access tokens between runs. Only used together with a username.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory in which to cache installation reports. Defaults to ~/.cache/zaptec-reporter.",
+        type=pathlib.Path,
+        default=zcache.default_cache_dir(),
+    )
+    parser.add_argument("--no-cache", help="Do not cache installation reports.", action="store_true")
+    parser.add_argument(
+        "--refresh",
+        help="Fetch installation reports from Zaptec Cloud even if they are cached or stored, and update them.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--store",
+        help="SQLite file in which to store installation reports of closed periods. Stored months are used instead"
+        " of fetching them again, and only the months that are missing are fetched from Zaptec Cloud.",
+        type=pathlib.Path,
+    )
+    parser.add_argument(
+        "--timeout",
+        help="Timeout in seconds for requests to Zaptec Cloud. Defaults to 120.",
+        type=float,
+        default=120,
+    )
+    parser.add_argument(
+        "--metrics",
+        help="File to which to write a JSON summary of phase timings, request latencies, retries and cache hits"
+        " when the run ends.",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        help="File to which to write the same metrics in the Prometheus text format when the run ends,"
+        " such as for the textfile collector of the node exporter.",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Directory to which to write a cProfile dump and summary of the run, along with tracemalloc snapshots"
+        " taken at the start and end of every phase.",
+        type=pathlib.Path,
+    )
+    parser.add_argument(
+        "--profile-top",
+        help="Number of functions and allocation sites to summarize per profile and phase. Defaults to 25.",
+        type=positive_int_arg,
+        default=25,
+    )
+    parser.add_argument(
+        "--pool-size",
+        help="Maximum number of pooled connections to Zaptec Cloud. Defaults to the report concurrency.",
+        type=positive_int_arg,
+    )
 
     # List installations.
     subparsers.add_parser("installations", help="List Zaptec installations.")
@@ -200,24 +931,205 @@ def main(argv=sys.argv[1:]) -> None:
         help='Start date to cover in the report. Example: "2024-10" or "last month".'
         "Defaults to beginning of last month.",
         type=parse_date_arg,
-        default=parse_date_arg("last month"),
+        default="last month",
     )
     parser_report.add_argument(
         "--to-date",
-        help='End date to cover in the report. Example: "2025" or "next year".' "Defaults to beginning of this month.",
+        help='End date to cover in the report. Example: "2025" or "next year".Defaults to beginning of this month.',
         type=parse_date_arg,
-        default=parse_date_arg("this month"),
+        default="this month",
+    )
+    parser_report.add_argument(
+        "-c",
+        "--concurrency",
+        help="Maximum number of installation reports to fetch concurrently. Defaults to 1.",
+        type=positive_int_arg,
+        default=1,
+    )
+    parser_report.add_argument(
+        "--group-by",
+        help="Group usage by user, charger or charge card name. May be given several times, in which case usage is"
+        " grouped every way, and every grouping is written to its own sheet. Defaults to charger.",
+        choices=GROUP_BY_CHOICES,
+        action="append",
+    )
+    parser_report.add_argument(
+        "--split-months",
+        help="Fetch usage one calendar month at a time, so that cached months are reused in long reports.",
+        action="store_true",
     )
     parser_report.add_argument("-x", "--excelout", help="Excel output file.")
+    parser_report.add_argument(
+        "--excel-writer",
+        help="Excel writer to use. The streaming writer does not need pandas and uses constant memory,"
+        " which makes it faster for large reports. Defaults to pandas.",
+        choices=EXCEL_WRITERS.keys(),
+        default="pandas",
+    )
+    parser_report.add_argument(
+        "-o",
+        "--output",
+        help="Usage output file, may be given several times. The format is told by the file extension"
+        " (.csv, .ndjson, .jsonl or .parquet) unless --output-format is given.",
+        action="append",
+        default=[],
+    )
+    parser_report.add_argument(
+        "--output-format",
+        help="Format of the usage output files.",
+        choices=[output_format.value for output_format in zsinks.OutputFormat],
+    )
+    parser_report.add_argument(
+        "--render-workers",
+        help="Number of processes in which to render Excel reports, when there are several of them. Defaults to 1.",
+        type=positive_int_arg,
+        default=1,
+    )
+    parser_report.add_argument(
+        "--archive",
+        help="Directory in which to archive every Excel report, by period, generation time and contents.",
+    )
     parser_report.add_argument("-e", "--email", help="Email YAML configuration file.")
+    parser_report.add_argument(
+        "-a",
+        "--all-installations",
+        help="Collect usage from all installations that the user has access to.",
+        action="store_true",
+    )
     parser_report.add_argument(
         "installations",
         help="IDs for the installations to collect usage from.",
-        nargs="+",
+        nargs="*",
+    )
+
+    # Export charge sessions.
+    parser_sessions = subparsers.add_parser("sessions", help="Export individual charge sessions.")
+    parser_sessions.add_argument(
+        "--from-date",
+        help='Start date of the sessions to export. Example: "2024-10" or "last month".'
+        " Defaults to beginning of last month.",
+        type=parse_date_arg,
+        default="last month",
+    )
+    parser_sessions.add_argument(
+        "--to-date",
+        help='End date of the sessions to export. Example: "2025" or "next year". Defaults to beginning of this month.',
+        type=parse_date_arg,
+        default="this month",
+    )
+    parser_sessions.add_argument(
+        "-c",
+        "--concurrency",
+        help="Maximum number of pages of sessions to fetch concurrently. Defaults to 1.",
+        type=positive_int_arg,
+        default=1,
+    )
+    parser_sessions.add_argument(
+        "--page-size",
+        help="Number of sessions to fetch per page. Defaults to 1000.",
+        type=positive_int_arg,
+        default=1000,
+    )
+    parser_sessions.add_argument(
+        "-o",
+        "--output",
+        help="Sessions output file. The format is told by the file extension (.csv, .ndjson, .jsonl or .parquet)"
+        " unless --output-format is given.",
+        required=True,
+    )
+    parser_sessions.add_argument(
+        "--output-format",
+        help="Format of the sessions output file.",
+        choices=[output_format.value for output_format in zsinks.OutputFormat],
+    )
+    parser_sessions.add_argument(
+        "-a",
+        "--all-installations",
+        help="Export sessions from all installations that the user has access to.",
+        action="store_true",
+    )
+    parser_sessions.add_argument(
+        "installations",
+        help="IDs for the installations to export sessions from.",
+        nargs="*",
+    )
+
+    # Run a batch of report jobs, once or on schedule.
+    parser_batch = subparsers.add_parser(
+        "batch", help="Generate several usage reports, fetching usage shared between them only once."
+    )
+    parser_daemon = subparsers.add_parser(
+        "daemon", help="Keep running, and generate usage reports on the schedules of the batch jobs."
+    )
+    for parser_jobs in (parser_batch, parser_daemon):
+        parser_jobs.add_argument(
+            "-c",
+            "--concurrency",
+            help="Maximum number of installation reports to fetch concurrently. Defaults to 1.",
+            type=positive_int_arg,
+            default=1,
+        )
+        parser_jobs.add_argument(
+            "--render-workers",
+            help="Number of processes in which to render Excel reports, when there are several of them. Defaults to 1.",
+            type=positive_int_arg,
+            default=1,
+        )
+        parser_jobs.add_argument("jobs", help="Batch YAML configuration file, a list of report jobs.")
+
+    # Serve usage reports over HTTP.
+    parser_serve = subparsers.add_parser("serve", help="Serve usage reports on demand over HTTP.")
+    parser_serve.add_argument("--host", help="Address to listen on. Defaults to 127.0.0.1.", default="127.0.0.1")
+    parser_serve.add_argument("--port", help="Port to listen on. Defaults to 8080.", type=int, default=8080)
+    parser_serve.add_argument(
+        "--workers",
+        help="Maximum number of requests to handle concurrently. Defaults to 4.",
+        type=positive_int_arg,
+        default=4,
+    )
+    parser_serve.add_argument(
+        "-c",
+        "--concurrency",
+        help="Maximum number of installation reports to fetch concurrently, per request. Defaults to 1.",
+        type=positive_int_arg,
+        default=1,
+    )
+    parser_serve.add_argument(
+        "--split-months",
+        help="Fetch usage one calendar month at a time, so that cached months are reused in long reports.",
+        action="store_true",
+    )
+    parser_serve.add_argument(
+        "--excel-writer",
+        help="Excel writer to use. Defaults to pandas.",
+        choices=EXCEL_WRITERS.keys(),
+        default="pandas",
+    )
+    parser_serve.add_argument(
+        "--max-entries",
+        help="Maximum number of recent results to keep in memory. Defaults to 128.",
+        type=positive_int_arg,
+        default=128,
+    )
+    parser_serve.add_argument(
+        "--ttl",
+        help="Seconds for which recent results are served from memory. Defaults to 300.",
+        type=float,
+        default=300,
     )
 
     # Parse arguments.
     args = parser.parse_args(argv)
+    if "report" == args.action and not args.all_installations and len(args.installations) == 0:
+        parser_report.error("at least one installation ID or --all-installations is required")
+    if "sessions" == args.action and not args.all_installations and len(args.installations) == 0:
+        parser_sessions.error("at least one installation ID or --all-installations is required")
+    for action, subparser in (("report", parser_report), ("sessions", parser_sessions)):
+        if action == args.action and args.from_date >= args.to_date:
+            subparser.error("--from-date must be before --to-date")
+    if "serve" == args.action and args.profile is not None:
+        # Requests are served from many threads at once, while snapshots and peaks are taken of the whole process.
+        parser_serve.error("--profile profiles single runs, and can not be used to serve requests")
 
     # Configure logging.
     logging.basicConfig(
@@ -226,23 +1138,126 @@ def main(argv=sys.argv[1:]) -> None:
         format="[%(asctime)s %(levelname)s] %(message)s",
     )
 
+    # Compile templates up front, so that syntax errors are found before any report is generated.
+    ztemplates.configure(None if args.no_cache else args.cache_dir / "templates")
+    if "report" == args.action:
+        for path in [args.excelout, *args.output]:
+            if path is not None:
+                ztemplates.compile_template(path, "output path")
+    elif "sessions" == args.action:
+        ztemplates.compile_template(args.output, "output path")
+
     # Parse email configuration.
-    if args.email is not None:
+    email = None
+    if getattr(args, "email", None) is not None:
         email = parse_email_config(args.email)
 
+    # Parse batch configuration.
+    if args.action in ("batch", "daemon"):
+        jobs = parse_batch_config(args.jobs)
+
+    if "daemon" == args.action:
+        unscheduled = [job.name for job in jobs if job.schedule is None]
+        if len(unscheduled) > 0:
+            parser_daemon.error(f"batch jobs without a schedule: {', '.join(unscheduled)}")
+
     # Dry run.
     if args.dry_run:
         logging.info(sys.argv)
         logging.debug(args)
         sys.exit(0)
 
+    # Metrics are only recorded if they are written somewhere.
+    zmetrics.configure(args.metrics, args.metrics_textfile)
+
     # Initialize API (and authorize if needed).
-    api = zapi.ZaptecAPI(args.password)
-    if args.username is not None:
-        api.authorize(args.username, args.password)
-
-    # Run command.
-    if "installations" == args.action:
-        logging.info(api.fetch_installations())
-    elif "report" == args.action:
-        report(api, args.installations, args.from_date, args.to_date, args.excelout, email)
+    pool_size = args.pool_size or getattr(args, "concurrency", 1) * getattr(args, "workers", 1)
+    token_cache = zapi.TokenCache(args.token_cache) if args.token_cache is not None else None
+    report_cache = None if args.no_cache else zcache.ReportCache(args.cache_dir / "reports", refresh=args.refresh)
+    profiler = contextlib.nullcontext()
+    if args.profile is not None:
+        from zaptec_reporter import profiling as zprofiling
+
+        profiler = zprofiling.Profiler(args.profile, args.profile_top)
+
+    usage_store = contextlib.nullcontext()
+    if args.store is not None:
+        from zaptec_reporter import store as zstore
+
+        usage_store = zstore.UsageStore(args.store, refresh=args.refresh)
+
+    with (
+        zmetrics.recording(),
+        profiler,
+        usage_store as usage_store,
+        zapi.ZaptecAPI(
+            args.password,
+            pool_size=pool_size,
+            timeout=args.timeout,
+            token_cache=token_cache,
+            report_cache=report_cache,
+            usage_store=usage_store,
+            base_url=args.api_url,
+        ) as api,
+    ):
+        if args.username is not None:
+            with zmetrics.phase("authorize"):
+                api.authorize(args.username, args.password)
+
+        # Run command.
+        if "installations" == args.action:
+            logging.info(api.fetch_installations())
+        elif "report" == args.action:
+            if args.all_installations:
+                installations = api.fetch_installation_ids(concurrency=args.concurrency)
+                args.installations += [
+                    installation_id for installation_id in installations if installation_id not in args.installations
+                ]
+                logging.info(f"Collecting usage from {len(args.installations)} installations.")
+
+            report(
+                api,
+                args.installations,
+                args.from_date,
+                args.to_date,
+                args.excelout,
+                email,
+                concurrency=args.concurrency,
+                split_by_month=args.split_months,
+                excel_writer=args.excel_writer,
+                output_paths=args.output,
+                output_format=args.output_format,
+                render_workers=args.render_workers,
+                archive_path=args.archive,
+                group_by=[
+                    zapi.InstallationGroupBy[name.upper().replace("-", "_")] for name in args.group_by or ["charger"]
+                ],
+            )
+        elif "sessions" == args.action:
+            if args.all_installations:
+                installations = api.fetch_installation_ids(concurrency=args.concurrency)
+                args.installations += [
+                    installation_id for installation_id in installations if installation_id not in args.installations
+                ]
+
+            sessions(
+                api,
+                args.installations,
+                args.from_date,
+                args.to_date,
+                args.output,
+                output_format=args.output_format,
+                concurrency=args.concurrency,
+                page_size=args.page_size,
+            )
+        elif "batch" == args.action:
+            batch(api, jobs, concurrency=args.concurrency, render_workers=args.render_workers)
+        elif "daemon" == args.action:
+            daemon(api, jobs, concurrency=args.concurrency, render_workers=args.render_workers)
+        elif "serve" == args.action:
+            from zaptec_reporter import server as zserver
+
+            service = zserver.ReportService(
+                api, args.concurrency, args.split_months, args.excel_writer, args.max_entries, args.ttl
+            )
+            zserver.serve(service, args.host, args.port, args.workers)
@@ -0,0 +1,116 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+CRON_FIELDS = {"minute": (0, 59), "hour": (0, 23), "day": (1, 31), "month": (1, 12), "weekday": (0, 7)}
+CRON_ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MAX_SCHEDULE_YEARS = 8
+
+
+def parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        # Parts such as "*", "5", "1-5", "*/15" and "10-50/20".
+        span, _, step = part.partition("/")
+        if span == "*":
+            start, end = low, high
+        elif "-" in span:
+            start, end = (int(value) for value in span.split("-", 1))
+        else:
+            start = int(span)
+            end = high if step else start
+
+        step = int(step) if step else 1
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"{part} is out of range {low}-{high}.")
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+class CronSchedule:
+    def __init__(self, expression):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression, expression).split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"{expression} is not a valid cron schedule.")
+
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS.values())
+        )
+
+        # Sunday is both 0 and 7. Just like cron, a day matches either field if both day and weekday are restricted.
+        if 7 in self.weekdays:
+            self.weekdays.add(0)
+        self.any_day = fields[2] == "*" or fields[4] == "*"
+
+        # Make sure that the schedule ever fires, such as not on February 30th.
+        self.next(datetime.now())
+
+    def __str__(self):
+        return self.expression
+
+    def matches_day(self, date):
+        day = date.day in self.days
+        weekday = (date.weekday() + 1) % 7 in self.weekdays
+        return day and weekday if self.any_day else day or weekday
+
+    def next(self, after):
+        # Find the first minute after the given time that matches the schedule, skipping ahead field by field.
+        time = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        while time.year <= after.year + MAX_SCHEDULE_YEARS:
+            if time.month not in self.months:
+                time = datetime(time.year + time.month // 12, time.month % 12 + 1, 1)
+            elif not self.matches_day(time):
+                time = datetime(time.year, time.month, time.day) + timedelta(days=1)
+            elif time.hour not in self.hours:
+                time = time.replace(minute=0) + timedelta(hours=1)
+            elif time.minute not in self.minutes:
+                time += timedelta(minutes=1)
+            else:
+                return time
+
+        raise ValueError(f"{self.expression} never fires.")
+
+
+class Scheduler:
+    def __init__(self, jobs, clock=datetime.now):
+        # Jobs are (schedule, job) pairs.
+        self.jobs = jobs
+        self.clock = clock
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        logging.info("Stopping scheduler after the current run.")
+        self.stopping.set()
+
+    def wait(self, seconds):
+        return self.stopping.wait(seconds)
+
+    def run(self, run_jobs):
+        next_times = [schedule.next(self.clock()) for schedule, _ in self.jobs]
+        while not self.stopping.is_set():
+            # Sleep until the next job is due, or until the scheduler is stopped.
+            next_time = min(next_times)
+            logging.info(f"Next run at {next_time}.")
+            if self.wait(max((next_time - self.clock()).total_seconds(), 0)):
+                break
+
+            # Run all due jobs together, and never start a run before the previous run has finished.
+            now = self.clock()
+            due = [i for i, time in enumerate(next_times) if time <= now]
+            run_jobs([self.jobs[i][1] for i in due])
+
+            # Runs that were missed while running are skipped rather than run late.
+            now = self.clock()
+            for i in due:
+                next_times[i] = self.jobs[i][0].next(now)
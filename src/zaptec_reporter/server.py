@@ -0,0 +1,207 @@
+import collections
+import concurrent.futures
+import csv
+import io
+import json
+import logging
+import signal
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from zaptec_reporter import api as zapi
+from zaptec_reporter import reporter as zreporter
+from zaptec_reporter import sinks as zsinks
+from zaptec_reporter import usage as zusage
+
+CONTENT_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class Coalescer:
+    def __init__(self, function, max_entries=128, ttl=300):
+        self.function = function
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.results = collections.OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            # Serve recent results, least recently used are evicted first.
+            if key in self.results:
+                result, expires_at = self.results[key]
+                if time.monotonic() < expires_at:
+                    self.results.move_to_end(key)
+                    return result
+
+                del self.results[key]
+
+            # Identical requests that arrive while a result is being computed wait for that same result.
+            future = self.in_flight.get(key, None)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self.in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self.function(*key)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            with self.lock:
+                self.results[key] = (result, time.monotonic() + self.ttl)
+                while len(self.results) > self.max_entries:
+                    self.results.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+        return result
+
+
+def render_json(usage_data):
+    columns, rows = zusage.usage_table(usage_data["Usage"])
+    usage = [dict(zip(columns, row)) for row in rows]
+    return json.dumps({"Metadata": usage_data["Metadata"], "Usage": usage}, default=zsinks.json_default).encode()
+
+
+def render_csv(usage_data):
+    columns, rows = zusage.usage_table(usage_data["Usage"])
+    f = io.StringIO(newline="")
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return f.getvalue().encode()
+
+
+class ReportService:
+    def __init__(self, api, concurrency=1, split_by_month=False, excel_writer="pandas", max_entries=128, ttl=300):
+        self.api = api
+        self.concurrency = concurrency
+        self.split_by_month = split_by_month
+        self.excel_writer = excel_writer
+
+        # Usage is fetched once for all formats, and each format is rendered once per usage.
+        self.usage = Coalescer(self.fetch, max_entries, ttl)
+        self.reports = Coalescer(self.render, max_entries, ttl)
+
+    def fetch(self, installations, from_date, to_date, group_by):
+        return zreporter.fetch_usage_data(
+            self.api, list(installations), from_date, to_date, group_by, self.concurrency, self.split_by_month
+        )
+
+    def render(self, installations, from_date, to_date, group_by, output_format):
+        usage_data = self.usage.get((installations, from_date, to_date, group_by))
+        if output_format == "xlsx":
+            return zreporter.EXCEL_WRITERS[self.excel_writer](usage_data).getvalue()
+        elif output_format == "csv":
+            return render_csv(usage_data)
+        else:
+            return render_json(usage_data)
+
+    def parse_query(self, query):
+        installations = tuple(dict.fromkeys(query.get("installation", list())))
+        if len(installations) == 0:
+            raise ValueError("At least one installation is required.")
+
+        group_by = query.get("group_by", ["charger"])[-1]
+        if group_by.upper().replace("-", "_") not in zapi.InstallationGroupBy.__members__:
+            raise ValueError(f"{group_by} is not a valid grouping.")
+
+        # Relative dates are resolved first, so that "last month" and "2024-11" share results.
+        from_date = zreporter.parse_date_arg(query.get("from", ["last month"])[-1])
+        to_date = zreporter.parse_date_arg(query.get("to", ["this month"])[-1])
+        zreporter.check_date_range(from_date, to_date)
+        return installations, from_date, to_date, zapi.InstallationGroupBy[group_by.upper().replace("-", "_")]
+
+    def report(self, key, output_format):
+        return self.reports.get((*key, output_format))
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    def respond(self, status, body, content_type="text/plain; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Reports are served as /report.xlsx, /report.json or /report.csv (and /report defaults to JSON).
+        url = urlsplit(self.path)
+        path, _, output_format = url.path.partition(".")
+        output_format = output_format or "json"
+        if path != "/report" or output_format not in CONTENT_TYPES:
+            self.respond(HTTPStatus.NOT_FOUND, b"Not found.\n")
+            return
+
+        try:
+            key = self.server.service.parse_query(parse_qs(url.query))
+        except ValueError as e:
+            self.respond(HTTPStatus.BAD_REQUEST, f"{e}\n".encode())
+            return
+
+        try:
+            body = self.server.service.report(key, output_format)
+        except Exception as e:
+            logging.error(f"Failed to generate report for {self.path}: {e}")
+            self.respond(HTTPStatus.BAD_GATEWAY, f"{e}\n".encode())
+        else:
+            self.respond(HTTPStatus.OK, body, CONTENT_TYPES[output_format])
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+
+class ReportServer(HTTPServer):
+    def __init__(self, address, service, workers=4):
+        super().__init__(address, ReportHandler)
+        self.service = service
+
+        # Requests are handled by a bounded pool of workers, rather than by a thread per request.
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+
+def serve(service, host="127.0.0.1", port=8080, workers=4):
+    server = ReportServer((host, port), service, workers)
+
+    # Stop serving on SIGTERM (or Ctrl-C). The server has to be shut down from another thread than the one serving.
+    def stop(*args):
+        logging.info("Stopping server.")
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logging.info(f"Serving usage reports on http://{host}:{server.server_port}/report.")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
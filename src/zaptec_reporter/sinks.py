@@ -0,0 +1,170 @@
+import contextlib
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import pathlib
+from datetime import datetime
+from enum import StrEnum
+
+from zaptec_reporter import files as zfiles
+from zaptec_reporter import usage as zusage
+
+
+class OutputFormat(StrEnum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+
+OUTPUT_FORMAT_EXTENSIONS = {
+    ".csv": OutputFormat.CSV,
+    ".ndjson": OutputFormat.NDJSON,
+    ".jsonl": OutputFormat.NDJSON,
+    ".parquet": OutputFormat.PARQUET,
+}
+
+
+def detect_output_format(path, output_format=None):
+    if output_format is not None:
+        return OutputFormat(output_format)
+
+    suffix = pathlib.Path(path).suffix.lower()
+    if suffix not in OUTPUT_FORMAT_EXTENSIONS:
+        raise ValueError(f"Unable to tell output format from file extension of {path}.")
+
+    return OUTPUT_FORMAT_EXTENSIONS[suffix]
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+
+    raise TypeError(f"{type(value).__name__} is not JSON serializable.")
+
+
+def json_text(value):
+    return json.dumps(value, default=json_default, ensure_ascii=False)
+
+
+def write_csv(rows, path, columns):
+    # Nested values, such as the energy details of charge sessions, are written as JSON.
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(
+            [json_text(value) if isinstance(value, (list, dict)) else value for value in row] for row in rows
+        )
+
+
+def write_ndjson(rows, path, columns):
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(columns, row)), default=json_default, ensure_ascii=False))
+            f.write("\n")
+
+
+def write_parquet(rows, path, columns, row_group_size=10000):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet output requires pyarrow, install zaptec-reporter[parquet].") from e
+
+    # Columns that are null throughout the first row group are written as text, whatever values come later.
+    text_columns = []
+
+    def write_row_group(writer, batch):
+        if writer is None:
+            table = pa.Table.from_pylist(batch)
+            text_columns.extend(field.name for field in table.schema if pa.types.is_null(field.type))
+            schema = pa.schema(
+                [pa.field(field.name, pa.string()) if field.name in text_columns else field for field in table.schema]
+            )
+            writer = pq.ParquetWriter(path, schema)
+
+        for row in batch:
+            for column in text_columns:
+                if row[column] is not None and not isinstance(row[column], str):
+                    row[column] = json_text(row[column])
+
+        writer.write_table(pa.Table.from_pylist(batch, schema=writer.schema), row_group_size=row_group_size)
+        return writer
+
+    # Write rows in row groups, so that only one row group is held in memory at a time.
+    writer = None
+    batch = []
+    try:
+        for row in rows:
+            batch.append(dict(zip(columns, row)))
+            if len(batch) >= row_group_size:
+                writer = write_row_group(writer, batch)
+                batch = []
+
+        if len(batch) > 0 or writer is None:
+            writer = write_row_group(writer, batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+OUTPUT_WRITERS = {
+    OutputFormat.CSV: write_csv,
+    OutputFormat.NDJSON: write_ndjson,
+    OutputFormat.PARQUET: write_parquet,
+}
+
+
+def write_usage(usage_data, path, output_format=None):
+    columns, rows = zusage.usage_table(usage_data["Usage"])
+    OUTPUT_WRITERS[detect_output_format(path, output_format)](rows, path, columns)
+
+
+def write_records(records, path, output_format=None, columns=(), sample_size=1000):
+    # Records are streamed, with the given columns followed by any other fields of the first records.
+    records = iter(records)
+    sample = list(itertools.islice(records, sample_size))
+    columns = list(dict.fromkeys([*columns, *(field for record in sample for field in record)]))
+    known = set(columns)
+
+    def rows():
+        for record in itertools.chain(sample, records):
+            if not known.issuperset(record):
+                unknown = set(record) - known
+                logging.warning(f"Leaving out fields not found in the first records: {', '.join(sorted(unknown))}.")
+                known.update(unknown)
+
+            yield tuple(record.get(column) for column in columns)
+
+    OUTPUT_WRITERS[detect_output_format(path, output_format)](rows(), path, columns)
+
+
+@contextlib.contextmanager
+def report_view(buffer):
+    # A read-only view of a rendered report, shared by every sink without copying the report.
+    if buffer is None:
+        yield None
+        return
+
+    with buffer.getbuffer() as exported, exported.toreadonly() as view:
+        yield view
+
+
+def write_report_file(view, path):
+    with open(path, "wb") as f:
+        f.write(view)
+
+
+def archive_report(view, directory, metadata):
+    # Reports are archived by period, named by when they were generated and by their contents.
+    digest = hashlib.sha256(view).hexdigest()[:8]
+    path = (
+        pathlib.Path(directory)
+        / f"{metadata['From']:%Y-%m-%d}_{metadata['To']:%Y-%m-%d}"
+        / f"usage_report_{metadata['Generated']:%Y%m%dT%H%M%S}_{digest}.xlsx"
+    )
+
+    # The archive never holds partial reports.
+    zfiles.write_atomic(path, view)
+    return path
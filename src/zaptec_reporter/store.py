@@ -0,0 +1,182 @@
+import logging
+import pathlib
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS api (
+    base_url TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS installations (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    timezone TEXT
+);
+
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    installation_id TEXT NOT NULL REFERENCES installations (id),
+    group_by INTEGER NOT NULL,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL,
+    grouped_by TEXT NOT NULL,
+    report_from TEXT NOT NULL,
+    report_to TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    UNIQUE (installation_id, group_by, date_from, date_to)
+);
+
+CREATE INDEX IF NOT EXISTS reports_period ON reports (date_from, date_to);
+
+CREATE TABLE IF NOT EXISTS usage (
+    report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    group_name TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    energy REAL NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (report_id, position)
+);
+
+CREATE INDEX IF NOT EXISTS usage_group_name ON usage (group_name);
+"""
+
+
+class UsageStore:
+    def __init__(self, path, refresh=False):
+        self.path = pathlib.Path(path)
+        self.refresh = refresh
+        self.lock = threading.Lock()
+
+        # One connection is shared by all fetching threads, one statement at a time.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def bind(self, base_url):
+        # A store only ever holds reports of one API, so that reports of other APIs (such as a mock API) never mix.
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT base_url FROM api").fetchone()
+            if row is None:
+                self.connection.execute("INSERT INTO api (base_url) VALUES (?)", (base_url,))
+            elif row[0] != base_url:
+                raise ValueError(f"Usage store {self.path} holds reports of {row[0]}, not of {base_url}.")
+
+    def covers(self, installation_id, date_from, date_to, group_by):
+        if self.refresh:
+            return False
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM reports WHERE installation_id = ? AND group_by = ? AND date_from = ? AND date_to = ?",
+                (installation_id, group_by.value, date_from, date_to),
+            ).fetchone()
+
+        return row is not None
+
+    def get(self, request_json):
+        if self.refresh:
+            return None
+
+        with self.lock:
+            report = self.connection.execute(
+                "SELECT reports.id, installations.name, installations.timezone, grouped_by, report_from, report_to"
+                " FROM reports JOIN installations ON installations.id = reports.installation_id"
+                " WHERE installation_id = ? AND group_by = ? AND date_from = ? AND date_to = ?",
+                (
+                    request_json["installationId"],
+                    request_json["groupBy"],
+                    request_json["fromDate"],
+                    request_json["endDate"],
+                ),
+            ).fetchone()
+            if report is None:
+                return None
+
+            report_id, name, timezone, grouped_by, report_from, report_to = report
+            usage = self.connection.execute(
+                "SELECT group_name, sessions, energy, duration FROM usage WHERE report_id = ? ORDER BY position",
+                (report_id,),
+            ).fetchall()
+
+        logging.debug(f"Using stored installation report for {request_json['installationId']}.")
+        return {
+            "InstallationName": name,
+            "InstallationTimeZone": timezone,
+            "GroupedBy": grouped_by,
+            "Fromdate": report_from,
+            "Enddate": report_to,
+            "totalUserChargerReportModel": [
+                {
+                    "GroupAsString": group_name,
+                    "TotalChargeSessionCount": sessions,
+                    "TotalChargeSessionEnergy": energy,
+                    "TotalChargeSessionDuration": duration,
+                }
+                for group_name, sessions, energy, duration in usage
+            ],
+        }
+
+    def put(self, request_json, report):
+        # Only reports covering closed periods are stored, as they never change.
+        if datetime.fromisoformat(request_json["endDate"]) > datetime.now():
+            return
+
+        installation_id = request_json["installationId"]
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO installations (id, name, timezone) VALUES (?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET name = excluded.name, timezone = excluded.timezone",
+                (installation_id, report["InstallationName"], report.get("InstallationTimeZone", None)),
+            )
+            (report_id,) = self.connection.execute(
+                "INSERT INTO reports"
+                " (installation_id, group_by, date_from, date_to, grouped_by, report_from, report_to, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (installation_id, group_by, date_from, date_to) DO UPDATE SET"
+                " grouped_by = excluded.grouped_by, report_from = excluded.report_from,"
+                " report_to = excluded.report_to, fetched_at = excluded.fetched_at"
+                " RETURNING id",
+                (
+                    installation_id,
+                    request_json["groupBy"],
+                    request_json["fromDate"],
+                    request_json["endDate"],
+                    report["GroupedBy"],
+                    report["Fromdate"],
+                    report["Enddate"],
+                    datetime.now().isoformat(),
+                ),
+            ).fetchone()
+
+            self.connection.execute("DELETE FROM usage WHERE report_id = ?", (report_id,))
+            self.connection.executemany(
+                "INSERT INTO usage (report_id, position, group_name, sessions, energy, duration)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        report_id,
+                        position,
+                        entry["GroupAsString"],
+                        entry["TotalChargeSessionCount"],
+                        entry["TotalChargeSessionEnergy"],
+                        entry["TotalChargeSessionDuration"],
+                    )
+                    for position, entry in enumerate(report["totalUserChargerReportModel"])
+                ],
+            )
+
+        logging.debug(f"Stored installation report for {installation_id}.")
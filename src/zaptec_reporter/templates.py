@@ -0,0 +1,45 @@
+import functools
+import hashlib
+import threading
+
+bytecode_cache_dir = None
+sources = {}
+sources_lock = threading.Lock()
+
+
+def configure(cache_dir):
+    global bytecode_cache_dir
+    bytecode_cache_dir = cache_dir
+
+
+@functools.cache
+def environment(bytecode_cache_dir):
+    import jinja2 as jinja
+
+    class SourceLoader(jinja.BaseLoader):
+        def get_source(self, environment, template):
+            if template not in sources:
+                raise jinja.TemplateNotFound(template)
+
+            source, name = sources[template]
+            return source, name, lambda: True
+
+    bytecode_cache = None
+    if bytecode_cache_dir is not None:
+        bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = jinja.FileSystemBytecodeCache(str(bytecode_cache_dir))
+
+    return jinja.Environment(loader=SourceLoader(), bytecode_cache=bytecode_cache, cache_size=-1)
+
+
+def compile_template(source, name="template"):
+    # Templates are keyed by their source, and compiled once per run (or loaded from the bytecode cache).
+    key = hashlib.sha256(source.encode()).hexdigest()
+    with sources_lock:
+        sources.setdefault(key, (source, name))
+
+    return environment(bytecode_cache_dir).get_template(key)
+
+
+def render(source, values, name="template"):
+    return compile_template(source, name).render(values)
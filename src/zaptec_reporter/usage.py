@@ -0,0 +1,90 @@
+from collections.abc import Sequence
+
+
+def format_duration(seconds):
+    # Same format as str(pd.Timedelta), for example "11 days 15:01:43".
+    days, seconds = divmod(int(seconds), 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{days} days {hours:02}:{minutes:02}:{seconds:02}"
+
+
+class Usage(Sequence):
+    def __init__(self, columns):
+        # Columns by name. Durations are kept as whole seconds until they are presented.
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["Energy"])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        row = {name: column[index] for name, column in self.columns.items()}
+        row["Duration"] = format_duration(row["Duration"])
+        return row
+
+    def __iter__(self):
+        display_columns = self.display_columns()
+        for values in zip(*display_columns.values()):
+            yield dict(zip(display_columns.keys(), values))
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and list(self) == list(other)
+
+    def filter(self, mask):
+        return Usage(
+            {name: [value for value, keep in zip(column, mask) if keep] for name, column in self.columns.items()}
+        )
+
+    def display_columns(self):
+        columns = {name: list(column) for name, column in self.columns.items()}
+        columns["Duration"] = [format_duration(seconds) for seconds in columns["Duration"]]
+        return columns
+
+
+def usage_table(usage):
+    # Column names and row tuples, from either usage columns or a list of usage rows.
+    if isinstance(usage, Usage):
+        display_columns = usage.display_columns()
+        return list(display_columns), zip(*display_columns.values())
+
+    # Columns in order of first appearance, just like a DataFrame built from the usage rows.
+    columns = list(dict.fromkeys(key for row in usage for key in row))
+    return columns, (tuple(row.get(column) for column in columns) for row in usage)
+
+
+def aggregate_usage(installation_reports):
+    # Gather all entries into columns in one pass. Groups are named after what the reports are grouped by.
+    group_names = list(dict.fromkeys(report["GroupedBy"] for report in installation_reports))
+    groups = {name: [] for name in group_names}
+    energy = []
+    hours = []
+    sessions = []
+    installations = []
+    for report in installation_reports:
+        entries = report["totalUserChargerReportModel"]
+        for name, column in groups.items():
+            if name == report["GroupedBy"]:
+                column.extend(entry["GroupAsString"] for entry in entries)
+            else:
+                column.extend(None for _ in entries)
+
+        energy.extend(entry["TotalChargeSessionEnergy"] for entry in entries)
+        hours.extend(entry["TotalChargeSessionDuration"] for entry in entries)
+        sessions.extend(entry["TotalChargeSessionCount"] for entry in entries)
+        installations.extend(report["InstallationName"] for _ in entries)
+
+    # Round durations to whole seconds, halves to even just like pd.Timedelta.round.
+    durations = [round(duration * 3600) for duration in hours]
+
+    return Usage(
+        {
+            **groups,
+            "Energy": energy,
+            "Duration": durations,
+            "Sessions": sessions,
+            "Installation": installations,
+        }
+    )
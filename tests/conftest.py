@@ -0,0 +1,70 @@
+import pytest
+import responses
+
+INSTALLATION_REPORT_URL = "https://api.zaptec.com/api/chargehistory/installationreport"
+
+
+@pytest.fixture
+def installation_report():
+    def installation_report(
+        installation_name="Installation A",
+        entries=(("NP1", 1, 10.0, 1.0),),
+        date_from="2024-12-01T00:00:00",
+        date_to="2025-01-01T00:00:00",
+        grouped_by="Charger",
+    ):
+        # Entries are (group, sessions, energy, duration) tuples.
+        return {
+            "InstallationName": installation_name,
+            "InstallationTimeZone": "Central European Standard Time",
+            "GroupedBy": grouped_by,
+            "Fromdate": date_from,
+            "Enddate": date_to,
+            "totalUserChargerReportModel": [
+                {
+                    "GroupAsString": group,
+                    "TotalChargeSessionCount": count,
+                    "TotalChargeSessionEnergy": energy,
+                    "TotalChargeSessionDuration": duration,
+                }
+                for group, count, energy, duration in entries
+            ],
+        }
+
+    return installation_report
+
+
+@pytest.fixture
+def mock_report(installation_report):
+    def mock_report(
+        installation_id=None, installation_name="Installation A", charger_name="NP1", status=200, report=None, **params
+    ):
+        # Answer with the report of one charger, or with the given report. Only requests for the given installation
+        # and with the given request parameters (such as fromDate) are answered.
+        if report is None:
+            report = installation_report(installation_name, [(charger_name, 1, 10.0, 1.0)])
+
+        if installation_id is not None:
+            params["installationId"] = installation_id
+
+        responses.post(
+            INSTALLATION_REPORT_URL,
+            status=status,
+            json=report,
+            match=[responses.matchers.json_params_matcher(params, strict_match=False)] if len(params) > 0 else [],
+        )
+
+    return mock_report
+
+
+@pytest.fixture
+def mock_month(installation_report, mock_report):
+    def mock_month(date_from, date_to, entries):
+        # Answer requests for one month of a report split by month.
+        mock_report(
+            report=installation_report(entries=entries, date_from=date_from, date_to=date_to),
+            fromDate=date_from,
+            endDate=date_to,
+        )
+
+    return mock_month
@@ -1,3 +1,8 @@
+import json
+import logging
+import time
+
+import pytest
 import responses
 
 from zaptec_reporter import api as zapi
@@ -88,6 +93,24 @@ class TestAPI:
         assert "bbbb-bbb-bbbb" == installations["Installation B (west)"]
         assert 2 == len(installations)
 
+    @responses.activate
+    def test_installation_ids(self):
+        responses.get(
+            "https://api.zaptec.com/api/installation",
+            json={
+                "Pages": 1,
+                "Data": [
+                    {"Id": "aaaa-aaa-aaaa", "Name": "Garage"},
+                    {"Id": "bbbb-bbb-bbbb", "Name": "Garage"},
+                    {"Id": "aaaa-aaa-aaaa", "Name": "Garage"},
+                ],
+            },
+        )
+
+        # Verify that installations sharing a name are all kept, but only once each.
+        api = zapi.ZaptecAPI("blablaiamatokenblablabla")
+        assert ["aaaa-aaa-aaaa", "bbbb-bbb-bbbb"] == api.fetch_installation_ids()
+
     @responses.activate
     def test_installation_report(self):
         ACCESS_TOKEN = "blablaiamatokenblablabla"
@@ -146,3 +169,231 @@ class TestAPI:
 
         # Sanity check that we got the JSON response back.
         assert "Installation A (north)" == report["InstallationName"]
+
+    @responses.activate
+    def test_pooled_session(self):
+        ACCESS_TOKEN = "blablaiamatokenblablabla"
+
+        responses.get("https://api.zaptec.com/api/installation", json={"Pages": 1, "Data": []})
+
+        # Trigger requests.
+        with zapi.ZaptecAPI(ACCESS_TOKEN, pool_size=4, timeout=(1, 2)) as api:
+            adapter = api.session.get_adapter("https://api.zaptec.com")
+            api.fetch_installations()
+            api.fetch_installations()
+
+        # Verify that the requests share one pooled adapter and use the configured timeout.
+        assert 4 == adapter._pool_maxsize
+        assert 2 == len(responses.calls)
+        assert all((1, 2) == call.request.req_kwargs["timeout"] for call in responses.calls)
+
+    @responses.activate
+    def test_token_cache(self, tmp_path):
+        ACCESS_TOKEN = "blablaiamatokenblablabla"
+        USERNAME = "username"
+        PASSWORD = "password"
+        TOKEN_CACHE_PATH = tmp_path / "cache" / "tokens.json"
+
+        responses.post(
+            "https://api.zaptec.com/oauth/token",
+            json={"access_token": ACCESS_TOKEN, "token_type": "Bearer", "expires_in": 86400},
+        )
+
+        # Authorize twice using the same token cache.
+        zapi.ZaptecAPI(token_cache=zapi.TokenCache(TOKEN_CACHE_PATH)).authorize(USERNAME, PASSWORD)
+        api = zapi.ZaptecAPI(token_cache=zapi.TokenCache(TOKEN_CACHE_PATH))
+        api.authorize(USERNAME, PASSWORD)
+
+        # Verify that the token was only requested once and that the cache is private.
+        assert 1 == len(responses.calls)
+        assert ACCESS_TOKEN == api.access_token
+        assert 0o600 == TOKEN_CACHE_PATH.stat().st_mode & 0o777
+
+    @responses.activate
+    def test_token_cache_expired(self, tmp_path):
+        token_cache = zapi.TokenCache(tmp_path / "tokens.json", margin=300)
+        token_cache.store("username", "expiringtoken", time.time() + 60)
+
+        responses.post("https://api.zaptec.com/oauth/token", json={"access_token": "newtoken", "expires_in": 86400})
+
+        # Verify that a token which is about to expire is refreshed.
+        api = zapi.ZaptecAPI(token_cache=token_cache)
+        api.authorize("username", "password")
+        assert "newtoken" == api.access_token
+        assert "newtoken" == token_cache.load("username")["access_token"]
+
+    @responses.activate
+    def test_token_refresh_on_unauthorized(self, tmp_path):
+        token_cache = zapi.TokenCache(tmp_path / "tokens.json")
+        token_cache.store("username", "revokedtoken", time.time() + 86400)
+
+        responses.post("https://api.zaptec.com/oauth/token", json={"access_token": "newtoken", "expires_in": 86400})
+        responses.get(
+            "https://api.zaptec.com/api/installation",
+            status=401,
+            match=[responses.matchers.header_matcher({"Authorization": "Bearer revokedtoken"})],
+        )
+        responses.get(
+            "https://api.zaptec.com/api/installation",
+            json={"Pages": 1, "Data": [{"Id": "aaaa-aaa-aaaa", "Name": "Installation A (north)"}]},
+            match=[responses.matchers.header_matcher({"Authorization": "Bearer newtoken"})],
+        )
+
+        # Verify that the rejected token is refreshed transparently.
+        api = zapi.ZaptecAPI(token_cache=token_cache)
+        api.authorize("username", "password")
+        assert {"Installation A (north)": "aaaa-aaa-aaaa"} == api.fetch_installations()
+        assert "newtoken" == token_cache.load("username")["access_token"]
+
+    @responses.activate
+    def test_installations_pagination(self):
+        ACCESS_TOKEN = "blablaiamatokenblablabla"
+
+        # Mock three pages of installations.
+        for page_index in range(3):
+            params = {
+                "Roles": zapi.UserRole.OWNER.value,
+                "InstallationType": zapi.InstallationType.PRO.value,
+                "ReturnIdNameOnly": "true",
+                "SortDescending": "false",
+                "IncludeDisabled": "false",
+            }
+            if page_index > 0:
+                params["PageIndex"] = page_index
+
+            responses.get(
+                "https://api.zaptec.com/api/installation",
+                json={
+                    "Pages": 3,
+                    "Data": [
+                        {"Id": f"id-{page_index}-{i}", "Name": f"Installation {page_index}-{i}"} for i in range(2)
+                    ],
+                },
+                match=[responses.matchers.query_param_matcher(params)],
+            )
+
+        # Trigger requests.
+        api = zapi.ZaptecAPI(ACCESS_TOKEN)
+        installations = list(api.iter_installations(concurrency=2))
+
+        # Verify that all pages were fetched and yielded in order.
+        assert 3 == len(responses.calls)
+        assert [f"id-{page_index}-{i}" for page_index in range(3) for i in range(2)] == [
+            installation["Id"] for installation in installations
+        ]
+
+    @responses.activate
+    def test_charge_history(self):
+        ACCESS_TOKEN = "blablaiamatokenblablabla"
+
+        # Mock three pages of charge sessions.
+        for page_index in range(3):
+            params = {
+                "InstallationId": "aaaa-aaa-aaaa",
+                "From": "2024-12-01T00:00:00",
+                "To": "2025-01-01T00:00:00",
+                "PageSize": "2",
+            }
+            if page_index > 0:
+                params["PageIndex"] = str(page_index)
+
+            responses.get(
+                "https://api.zaptec.com/api/chargehistory",
+                json={
+                    "Pages": 3,
+                    "Data": [{"Id": f"session-{page_index}-{i}", "Energy": 1.5 * i} for i in range(2)],
+                },
+                match=[responses.matchers.query_param_matcher(params)],
+            )
+
+        api = zapi.ZaptecAPI(ACCESS_TOKEN)
+        sessions = api.iter_charge_history(
+            "aaaa-aaa-aaaa", "2024-12-01T00:00:00", "2025-01-01T00:00:00", page_size=2, concurrency=2
+        )
+
+        # Verify that nothing is fetched until sessions are consumed.
+        assert 0 == len(responses.calls)
+        assert "session-0-0" == next(sessions)["Id"]
+        assert 1 == len(responses.calls)
+
+        # Verify that all pages were fetched and yielded in order.
+        assert [f"session-{page_index}-{i}" for page_index in range(3) for i in range(2)][1:] == [
+            session["Id"] for session in sessions
+        ]
+        assert 3 == len(responses.calls)
+
+    @responses.activate
+    def test_base_url(self):
+        responses.get(
+            "http://127.0.0.1:8081/api/installation",
+            json={"Pages": 1, "Data": [{"Id": "aaaa-aaa-aaaa", "Name": "Installation A (north)"}]},
+        )
+
+        # Verify that requests are made to another API than Zaptec Cloud when asked to.
+        api = zapi.ZaptecAPI("token", base_url="http://127.0.0.1:8081/")
+        assert {"Installation A (north)": "aaaa-aaa-aaaa"} == api.fetch_installations()
+
+
+class TestReportStream:
+    REPORT = {
+        "InstallationName": "Installation Å",
+        "InstallationTimeZone": None,
+        "GroupedBy": "User",
+        "Fromdate": "2024-12-01T00:00:00",
+        "totalUserChargerReportModel": [
+            {
+                "GroupAsString": f"User {i}",
+                "UserEmail": f"user{i}@mail.com",
+                "TotalChargeSessionCount": 10 * i,
+                "TotalChargeSessionEnergy": 123.456 * i,
+                "TotalChargeSessionDuration": 1e-3 * i,
+            }
+            for i in range(20)
+        ],
+        "Enddate": "2025-01-01T00:00:00",
+    }
+
+    def expected_report(self):
+        entries = [
+            {field: entry[field] for field in zapi.REPORT_ENTRY_FIELDS} for entry in self.REPORT[zapi.REPORT_ENTRIES]
+        ]
+        return {**self.REPORT, zapi.REPORT_ENTRIES: entries}
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_read_report(self, chunk_size):
+        # Cut the report anywhere, including in the middle of numbers and strings.
+        text = json.dumps(self.REPORT, indent=2)
+        report = zapi.read_report(text[i : i + chunk_size] for i in range(0, len(text), chunk_size))
+        assert self.expected_report() == report
+
+    def test_iter_report(self):
+        items = zapi.iter_report([json.dumps(self.REPORT)])
+        assert ("InstallationName", "Installation Å") == next(items)
+
+        # Verify that entries are yielded one at a time.
+        keys = [key for key, _ in items]
+        assert 20 == keys.count(zapi.REPORT_ENTRIES)
+        assert "Enddate" == keys[-1]
+
+    def test_empty_entries(self):
+        assert {"GroupedBy": "User", zapi.REPORT_ENTRIES: []} == zapi.read_report(
+            ['{"GroupedBy": "User", "totalUserChargerReportModel": []}']
+        )
+        assert {zapi.REPORT_ENTRIES: []} == zapi.read_report(['{"totalUserChargerReportModel": null}'])
+
+    def test_truncated_report(self):
+        with pytest.raises(ValueError):
+            zapi.read_report([json.dumps(self.REPORT)[:-20]])
+
+    @responses.activate
+    def test_installation_report(self, caplog):
+        responses.post("https://api.zaptec.com/api/chargehistory/installationreport", json=self.REPORT)
+
+        api = zapi.ZaptecAPI("token")
+        with caplog.at_level(logging.DEBUG):
+            report = api.fetch_installation_report("aaaa-aaa-aaaa", "2024-12-01T00:00:00", "2025-01-01T00:00:00")
+
+        # Verify that the streamed report is parsed, and that it is logged in brief.
+        assert self.expected_report() == report
+        assert all(len(record.getMessage()) < 1000 for record in caplog.records)
+        assert any("User 0" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+import time
+
+import pytest
+import responses
+
+from zaptec_reporter import api as zapi
+from zaptec_reporter import cache as zcache
+
+
+class TestReportCache:
+    ACCESS_TOKEN = "blablaiamatokenblablabla"
+    INSTALLATION_ID = "aaaa-aaa-aaaa"
+
+    @pytest.fixture
+    def mock_energy(self, installation_report, mock_report):
+        # Answer with the report of one charger, with the given energy.
+        def mock_energy(energy):
+            mock_report(report=installation_report(entries=[("NP1", 1, energy, 1.0)]))
+
+        return mock_energy
+
+    def energy(self, report):
+        return report["totalUserChargerReportModel"][0]["TotalChargeSessionEnergy"]
+
+    @responses.activate
+    def test_closed_period(self, tmp_path, mock_energy):
+        mock_energy(272.797)
+
+        # Fetch the same closed period twice.
+        api = zapi.ZaptecAPI(self.ACCESS_TOKEN, report_cache=zcache.ReportCache(tmp_path))
+        api.fetch_installation_report(self.INSTALLATION_ID, "2024-12-01T00:00:00", "2025-01-01T00:00:00")
+        report = api.fetch_installation_report(self.INSTALLATION_ID, "2024-12-01T00:00:00", "2025-01-01T00:00:00")
+
+        # Verify that the report was only fetched once, and that it is stored compressed without expiry.
+        assert 1 == len(responses.calls)
+        assert 272.797 == self.energy(report)
+
+        (path,) = tmp_path.glob("*.json.gz")
+        assert json.loads(gzip.decompress(path.read_bytes()))["expires_at"] is None
+
+    @responses.activate
+    def test_open_period(self, tmp_path, mock_energy):
+        mock_energy(1.0)
+        mock_energy(2.0)
+
+        # Fetch a period that is still in progress, with an expired cache entry in between.
+        report_cache = zcache.ReportCache(tmp_path, ttl=-1)
+        api = zapi.ZaptecAPI(self.ACCESS_TOKEN, report_cache=report_cache)
+        api.fetch_installation_report(self.INSTALLATION_ID, "2024-12-01T00:00:00", "2999-01-01T00:00:00")
+        report = api.fetch_installation_report(self.INSTALLATION_ID, "2024-12-01T00:00:00", "2999-01-01T00:00:00")
+
+        # Verify that the report was fetched again.
+        assert 2 == len(responses.calls)
+        assert 2.0 == self.energy(report)
+
+    @responses.activate
+    def test_refresh(self, tmp_path, mock_energy):
+        mock_energy(1.0)
+        mock_energy(2.0)
+
+        # Fill the cache, then refresh it.
+        args = (self.INSTALLATION_ID, "2024-12-01T00:00:00", "2025-01-01T00:00:00")
+        for refresh in [False, True, False]:
+            api = zapi.ZaptecAPI(self.ACCESS_TOKEN, report_cache=zcache.ReportCache(tmp_path, refresh=refresh))
+            report = api.fetch_installation_report(*args)
+
+        # Verify that the refreshed report replaced the cached one.
+        assert 2 == len(responses.calls)
+        assert 2.0 == self.energy(report)
+
+    @responses.activate
+    def test_base_url(self, tmp_path, installation_report, mock_energy):
+        mock_energy(1.0)
+        responses.post(
+            "http://localhost:8080/api/chargehistory/installationreport",
+            json=installation_report(entries=[("NP1", 1, 2.0, 1.0)]),
+        )
+
+        # Fetch the same report from two APIs.
+        args = (self.INSTALLATION_ID, "2024-12-01T00:00:00", "2025-01-01T00:00:00")
+        zapi.ZaptecAPI(self.ACCESS_TOKEN, report_cache=zcache.ReportCache(tmp_path)).fetch_installation_report(*args)
+        api = zapi.ZaptecAPI(
+            self.ACCESS_TOKEN, report_cache=zcache.ReportCache(tmp_path), base_url="http://localhost:8080"
+        )
+        report = api.fetch_installation_report(*args)
+
+        # Verify that reports of one API are not reused for the other.
+        assert 2 == len(responses.calls)
+        assert 2.0 == self.energy(report)
+
+    def test_eviction(self, tmp_path):
+        report_cache = zcache.ReportCache(tmp_path, max_size=1000)
+        report = {"totalUserChargerReportModel": [{"GroupAsString": os.urandom(300).hex()}]}
+
+        # Fill the cache beyond its size limit, making sure that the first entry is the least recently used.
+        requests_json = [
+            {"installationId": str(i), "fromDate": "2024-12-01", "endDate": "2025-01-01", "groupBy": 1}
+            for i in range(4)
+        ]
+        for i, request_json in enumerate(requests_json):
+            report_cache.put(request_json, report)
+            os.utime(report_cache.path(request_json), (time.time() - 100 + i, time.time() - 100 + i))
+
+        # Verify that the least recently used entries were evicted.
+        assert report_cache.get(requests_json[0]) is None
+        assert report_cache.get(requests_json[-1]) is not None
+        assert sum(path.stat().st_size for path in tmp_path.glob("*.json.gz")) <= 1000
@@ -0,0 +1,189 @@
+import concurrent.futures
+import email
+import socketserver
+import threading
+from datetime import datetime
+
+import pytest
+
+from zaptec_reporter import email as zemail
+from zaptec_reporter import excel as zexcel
+from zaptec_reporter import usage as zusage
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # A minimal SMTP server, just enough for smtplib to log in and send messages.
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost")
+        while line := self.rfile.readline().decode().strip():
+            command = line.split(" ")[0].upper()
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.reply("535 Authentication failed" if self.server.reject_logins else "235 Authenticated")
+            elif command == "DATA":
+                if self.server.drop > 0:
+                    # Drop the connection, as a server timing out an idle connection would.
+                    self.server.drop -= 1
+                    return
+
+                self.reply("354 Go ahead")
+                data = []
+                while (line := self.rfile.readline()) != b".\r\n":
+                    data.append(line.replace(b"\r\n", b"\n"))
+
+                self.server.messages.append(email.message_from_bytes(b"".join(data)))
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("localhost", 0), SMTPHandler)
+        self.connections = 0
+        self.drop = 0
+        self.reject_logins = False
+        self.messages = []
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_email(server, **kwargs):
+    return zemail.Email(
+        "localhost",
+        server.server_address[1],
+        zemail.EmailEncryption.DISABLED,
+        "nikola",
+        "Zaptec!23",
+        "Charge report for {{ Recipient }}",
+        ("Zaptec Reporter", "nikola.tesla@mail.com"),
+        text="{% for item in Usage %}{{ item.Charger }}\n{% endfor %}",
+        filename="charger_report.xlsx",
+        **kwargs,
+    )
+
+
+def render_excel_reports(datasets):
+    return [zexcel.create_excel_usage_report(values) for values in datasets]
+
+
+def usage_data():
+    usage = zusage.aggregate_usage(
+        [
+            {
+                "InstallationName": installation,
+                "GroupedBy": "Charger",
+                "totalUserChargerReportModel": [
+                    {
+                        "GroupAsString": charger,
+                        "TotalChargeSessionCount": 1,
+                        "TotalChargeSessionEnergy": 1.5,
+                        "TotalChargeSessionDuration": 0.5,
+                    }
+                    for charger in chargers
+                ],
+            }
+            for installation, chargers in {"Garage": ["Tesla", "Edison"], "Lab": ["Faraday"]}.items()
+        ]
+    )
+    return {"Usage": usage, "Metadata": {"Generated": datetime(2024, 12, 1), "From": datetime(2024, 11, 1)}}
+
+
+class TestEmail:
+    def test_send(self, smtp_server):
+        create_email(smtp_server, to=["thomas.edison@mail.com"], cc=["joseph.swan@mail.com"]).send(
+            usage_data(), zexcel.create_excel_usage_report(usage_data()).getbuffer().toreadonly()
+        )
+
+        assert 1 == len(smtp_server.messages)
+        assert "thomas.edison@mail.com" == smtp_server.messages[0]["To"]
+        assert "joseph.swan@mail.com" == smtp_server.messages[0]["Cc"]
+
+    def test_send_personalized(self, smtp_server):
+        recipients = [
+            zemail.Recipient(["thomas.edison@mail.com"], name="Edison", chargers=["Edison"]),
+            zemail.Recipient(["michael.faraday@mail.com"], name="Faraday", installations=["Lab"]),
+            zemail.Recipient(["nikola.tesla@mail.com"], name="Tesla", chargers=["Tesla", "Faraday"]),
+        ]
+        rendered = []
+
+        def render(datasets):
+            rendered.extend(values["Usage"] for values in datasets)
+            return [zexcel.create_excel_usage_report(values) for values in datasets]
+
+        create_email(smtp_server, recipients=recipients, connections=2).send_personalized(usage_data(), render, 3)
+
+        # Verify that every recipient got a report of their own chargers only.
+        messages = {message["Subject"]: message for message in smtp_server.messages}
+        assert ["Charge report for Edison", "Charge report for Faraday", "Charge report for Tesla"] == sorted(messages)
+        assert "Edison\n" == messages["Charge report for Edison"].get_payload()[0].get_payload()
+        assert "Faraday\n" == messages["Charge report for Faraday"].get_payload()[0].get_payload()
+        assert "Tesla\nFaraday\n" == messages["Charge report for Tesla"].get_payload()[0].get_payload()
+        assert [1, 1, 2] == sorted(len(usage) for usage in rendered)
+
+        # Verify that connections were reused rather than opened per recipient.
+        assert smtp_server.connections <= 2
+
+    def test_filter_views(self):
+        values = usage_data()
+        values["Views"] = {"Charger": values["Usage"], "Installation": values["Usage"]}
+
+        # Verify that every view is filtered, and not only the usage.
+        filtered_values = zemail.Recipient(["michael.faraday@mail.com"], installations=["Lab"]).filter_values(values)
+        assert ["Faraday"] == [usage["Charger"] for usage in filtered_values["Usage"]]
+        assert ["Faraday"] == [usage["Charger"] for usage in filtered_values["Views"]["Installation"]]
+        assert 3 == len(values["Views"]["Charger"])
+
+    def test_reconnect(self, smtp_server):
+        smtp_server.drop = 1
+        recipients = [zemail.Recipient(["thomas.edison@mail.com"]), zemail.Recipient(["joseph.swan@mail.com"])]
+
+        create_email(smtp_server, recipients=recipients).send_personalized(usage_data(), render_excel_reports)
+
+        assert 2 == len(smtp_server.messages)
+        assert 2 == smtp_server.connections
+
+    def test_failed_recipient(self, smtp_server):
+        smtp_server.drop = 2
+        recipients = [zemail.Recipient(["thomas.edison@mail.com"]), zemail.Recipient(["joseph.swan@mail.com"])]
+
+        with pytest.raises(zemail.EmailError) as excinfo:
+            create_email(smtp_server, recipients=recipients).send_personalized(usage_data(), render_excel_reports)
+
+        # Verify that the other recipient was still reached.
+        assert ["thomas.edison@mail.com"] == list(excinfo.value.errors)
+        assert ["joseph.swan@mail.com"] == [message["To"] for message in smtp_server.messages]
+
+    def test_failed_login(self, smtp_server):
+        smtp_server.reject_logins = True
+        recipients = [zemail.Recipient([f"recipient{i}@mail.com"]) for i in range(3)]
+        email = create_email(smtp_server, recipients=recipients, connections=1)
+
+        # Verify that senders waiting for the one connection give up rather than wait forever.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(email.send_personalized, usage_data(), render_excel_reports, 3)
+            with pytest.raises(zemail.EmailError) as excinfo:
+                future.result(timeout=30)
+
+        assert 3 == len(excinfo.value.errors)
+        assert all("Authentication failed" in str(error) for error in excinfo.value.errors.values())
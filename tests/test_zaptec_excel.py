@@ -0,0 +1,72 @@
+import io
+from datetime import datetime
+
+import openpyxl
+
+from zaptec_reporter import excel as zexcel
+from zaptec_reporter import reporter as zreporter
+
+
+class TestExcel:
+    DATA = {
+        "Usage": [
+            {
+                "Charger": "NP1",
+                "Energy": 272.797,
+                "Duration": "11 days 15:01:43",
+                "Sessions": 11,
+                "Installation": "Installation A (north)",
+            },
+            {
+                "Charger": "VP1 with a rather long name",
+                "Energy": 43.114,
+                "Duration": "0 days 10:30:00",
+                "Sessions": 2,
+                "Installation": "Installation B (west)",
+            },
+        ],
+        "Metadata": {
+            "Generated": datetime(2025, 1, 2, 3, 4, 5),
+            "From": datetime(2024, 12, 1),
+            "To": datetime(2025, 1, 1),
+            "Timezone": "Central European Standard Time",
+        },
+    }
+
+    def load(self, buffer):
+        return openpyxl.load_workbook(io.BytesIO(buffer.getvalue())).worksheets[0]
+
+    def test_same_layout_as_pandas(self):
+        expected = self.load(zreporter.create_excel_usage_report(self.DATA))
+        actual = self.load(zexcel.create_excel_usage_report(self.DATA))
+
+        # Verify that values, number formats and column widths are the same as when writing through pandas.
+        assert list(expected.iter_rows(values_only=True)) == list(actual.iter_rows(values_only=True))
+        assert [cell.number_format for row in expected.iter_rows() for cell in row] == [
+            cell.number_format for row in actual.iter_rows() for cell in row
+        ]
+        assert {key: dimension.width for key, dimension in expected.column_dimensions.items()} == {
+            key: dimension.width for key, dimension in actual.column_dimensions.items()
+        }
+
+    def test_missing_values(self):
+        data = {"Usage": [{"Charger": "NP1"}, {"User": "Nikola", "Energy": 1.0}], "Metadata": {}}
+        worksheet = self.load(zexcel.create_excel_usage_report(data))
+
+        # Verify that columns are collected from all rows, and that missing values are left blank.
+        assert [("Charger", "User", "Energy"), ("NP1", None, None), (None, "Nikola", 1.0)] == list(
+            worksheet.iter_rows(min_row=2, values_only=True)
+        )
+
+    def test_parallel_rendering(self):
+        datasets = [
+            {**self.DATA, "Usage": self.DATA["Usage"][:i], "Metadata": {**self.DATA["Metadata"], "Installation": i}}
+            for i in range(4)
+        ]
+
+        # Verify that workbooks rendered in worker processes are identical to workbooks rendered one at a time.
+        for excel_writer in zreporter.EXCEL_WRITERS:
+            serial = zreporter.render_excel_reports(datasets, excel_writer)
+            parallel = zreporter.render_excel_reports(datasets, excel_writer, workers=2)
+            assert [buffer.getvalue() for buffer in serial] == [buffer.getvalue() for buffer in parallel]
+            assert 4 == len(set(buffer.getvalue() for buffer in parallel))
@@ -0,0 +1,19 @@
+from zaptec_reporter import files as zfiles
+
+
+class TestWriteAtomic:
+    def test_replace(self, tmp_path):
+        path = tmp_path / "nested" / "report.json"
+        zfiles.write_atomic(path, "first")
+        zfiles.write_atomic(path, b"second")
+
+        # Verify that the file was replaced, without leaving temporary files behind.
+        assert "second" == path.read_text()
+        assert [path] == list(path.parent.iterdir())
+
+    def test_private(self, tmp_path):
+        path = tmp_path / "private" / "tokens.json"
+        zfiles.write_atomic(path, "{}", private=True)
+
+        assert 0o600 == path.stat().st_mode & 0o777
+        assert 0o700 == path.parent.stat().st_mode & 0o777
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+import responses
+
+import zaptec_reporter as zap
+from zaptec_reporter import api as zapi
+from zaptec_reporter import metrics as zmetrics
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    yield
+    zmetrics.configure()
+
+
+class TestMetrics:
+    def test_disabled(self):
+        zmetrics.configure()
+        with zmetrics.phase("fetch"):
+            zmetrics.count("retries")
+
+        # Verify that nothing is recorded, and that requests are not observed.
+        assert {} == zmetrics.phases
+        assert 0 == zmetrics.counters["retries"]
+        assert [] == zapi.ZaptecAPI("token").session.hooks["response"]
+
+    def test_prometheus(self, tmp_path):
+        zmetrics.configure(textfile=tmp_path / "zaptec.prom")
+        with zmetrics.phase("fetch"):
+            zmetrics.count("report_cache_hits", 2)
+        zmetrics.write()
+
+        lines = (tmp_path / "zaptec.prom").read_text().splitlines()
+        assert "zaptec_reporter_last_run_success 1" in lines
+        assert "zaptec_reporter_report_cache_hits_total 2" in lines
+        assert "zaptec_reporter_retries_total 0" in lines
+        assert any(line.startswith('zaptec_reporter_phase_seconds_total{phase="fetch"} ') for line in lines)
+        assert [path.name for path in tmp_path.iterdir()] == ["zaptec.prom"]
+
+    @responses.activate
+    def test_report(self, tmp_path, mock_report):
+        responses.post("https://api.zaptec.com/oauth/token", json={"access_token": "token", "expires_in": 86400})
+        mock_report(status=401)
+        mock_report()
+
+        zap.main(
+            (
+                f"-u user -p password --no-cache --metrics {tmp_path / 'metrics.json'} "
+                f"--metrics-textfile {tmp_path / 'zaptec.prom'} report -x {tmp_path / 'report.xlsx'} "
+                "--from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa"
+            ).split()
+        )
+
+        # Verify that phases, request latencies and retries were recorded.
+        metrics = json.loads((tmp_path / "metrics.json").read_text())
+        assert metrics["success"]
+        assert {"authorize", "fetch", "aggregate", "render", "write"} == set(metrics["phases"])
+        assert 1 == metrics["counters"]["retries"]
+        assert sorted(
+            (request["method"], request["endpoint"], request["status"], request["count"])
+            for request in metrics["requests"]
+        ) == [
+            ("POST", "/api/chargehistory/installationreport", 200, 1),
+            ("POST", "/api/chargehistory/installationreport", 401, 1),
+            ("POST", "/oauth/token", 200, 2),
+        ]
+        assert (
+            'zaptec_reporter_http_request_duration_seconds_count{method="POST",'
+            'endpoint="/api/chargehistory/installationreport",status="401"} 1'
+        ) in (tmp_path / "zaptec.prom").read_text().splitlines()
+
+    @responses.activate
+    def test_report_failure(self, tmp_path, mock_report):
+        mock_report(status=500)
+
+        with pytest.raises(zap.reporter.FetchError):
+            zap.main(
+                (
+                    f"-p token --no-cache --metrics {tmp_path / 'metrics.json'} report "
+                    "--from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa"
+                ).split()
+            )
+
+        # Verify that metrics are written also when the run fails.
+        metrics = json.loads((tmp_path / "metrics.json").read_text())
+        assert not metrics["success"]
+        assert [500] == [request["status"] for request in metrics["requests"]]
@@ -0,0 +1,80 @@
+import pstats
+import threading
+import tracemalloc
+
+import pytest
+import responses
+
+import zaptec_reporter as zap
+from zaptec_reporter import metrics as zmetrics
+from zaptec_reporter import profiling as zprofiling
+
+
+class TestProfiler:
+    @responses.activate
+    def test_report(self, tmp_path, mock_report):
+        mock_report()
+
+        profile_path = tmp_path / "profile"
+        zap.main(
+            (
+                f"-p token --no-cache --profile {profile_path} --profile-top 5 report --excel-writer streaming "
+                f"-x {tmp_path / 'report.xlsx'} --from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa"
+            ).split()
+        )
+
+        # Verify that the profile covers the run, and that a snapshot was taken at both ends of every phase.
+        stats = pstats.Stats(str(profile_path / "profile.pstats"))
+        assert any("create_excel_usage_report" == function for _, _, function in stats.stats)
+        assert "cumulative" in (profile_path / "profile.txt").read_text()
+
+        snapshots = sorted(path.name for path in profile_path.glob("*.snapshot"))
+        assert snapshots == [
+            "01-fetch-start.snapshot",
+            "02-fetch-end.snapshot",
+            "03-aggregate-start.snapshot",
+            "04-aggregate-end.snapshot",
+            "05-render-start.snapshot",
+            "06-render-end.snapshot",
+            "07-write-start.snapshot",
+            "08-write-end.snapshot",
+        ]
+        tracemalloc.Snapshot.load(str(profile_path / snapshots[-1]))
+
+        memory = (profile_path / "memory.txt").read_text()
+        assert ["fetch", "aggregate", "render", "write"] == [
+            line.partition(":")[0] for line in memory.splitlines() if not line.startswith(" ")
+        ]
+
+        # Verify that profiling is switched off again.
+        assert not zmetrics.enabled
+        assert not tracemalloc.is_tracing()
+
+    def test_threads(self, tmp_path):
+        # Verify that phases of the same name in different threads are kept apart.
+        with zprofiling.Profiler(tmp_path) as profiler:
+            thread_started = threading.Event()
+            main_ended = threading.Event()
+
+            def worker():
+                with zmetrics.phase("render"):
+                    thread_started.set()
+                    main_ended.wait(timeout=30)
+
+            thread = threading.Thread(target=worker)
+            with zmetrics.phase("render"):
+                thread.start()
+                thread_started.wait(timeout=30)
+            main_ended.set()
+            thread.join()
+
+        assert {} == profiler.started
+        assert ["render", "render"] == [
+            line.partition(":")[0]
+            for line in (tmp_path / "memory.txt").read_text().splitlines()
+            if not line[0].isspace()
+        ]
+
+    def test_serve(self, tmp_path):
+        with pytest.raises(SystemExit):
+            zap.main(f"-p token --profile {tmp_path} serve".split())
@@ -1,7 +1,10 @@
+import json
 import openpyxl
 import os
 import pytest
 import responses
+import subprocess
+import sys
 import yaml
 from datetime import datetime
 from unittest.mock import patch
@@ -27,6 +30,86 @@ class TestParseDateArg:
         with pytest.raises(ValueError):
             zap.parse_date_arg("zap")
 
+    @pytest.mark.parametrize(
+        "date",
+        [
+            "2024",
+            "2024-5",
+            "2024-05",
+            "2024-5-30",
+            "2024-12-01T10:30:00",
+            "2024-12-01 10:30",
+            "today",
+            "yesterday",
+            "tomorrow",
+            "this week",
+            "last week",
+            "this month",
+            "Last  Month",
+            "next month",
+            "this year",
+            "last year",
+            "next year",
+            "3 days ago",
+            "2 months ago",
+            "1 year ago",
+        ],
+    )
+    def test_fast_path(self, date):
+        # Verify that dates parsed without dateparser are truncated just like dateparser dates.
+        assert zap.reporter.parse_date_fast(date) is not None
+
+        with patch("zaptec_reporter.reporter.parse_date_fast", return_value=None):
+            expected = zap.parse_date_arg(date)
+
+        assert expected == zap.parse_date_arg(date)
+
+
+class TestStartup:
+    HEAVY_MODULES = ["pandas", "jinja2", "yaml", "email_validator", "xlsxwriter", "openpyxl"]
+
+    def imported_modules(self, argv=None):
+        code = "import sys, zaptec_reporter"
+        if argv is not None:
+            code += f"\ntry:\n    zaptec_reporter.main({argv!r})\nexcept SystemExit:\n    pass"
+        code += "\nprint(' '.join(sys.modules))"
+
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        return set(result.stdout.splitlines()[-1].split())
+
+    def test_import(self):
+        modules = self.imported_modules()
+        assert [] == [module for module in self.HEAVY_MODULES + ["dateparser", "requests"] if module in modules]
+
+    def test_dry_run_installations(self):
+        modules = self.imported_modules(["--dry-run", "-p", "token", "installations"])
+        assert [] == [module for module in self.HEAVY_MODULES + ["dateparser"] if module in modules]
+
+    def test_dry_run_report(self):
+        modules = self.imported_modules(["--dry-run", "-p", "token", "report", "--from-date", "last year", "abc"])
+        assert [] == [module for module in self.HEAVY_MODULES + ["dateparser"] if module in modules]
+
+
+class TestParseRecipient:
+    def test_single_names(self):
+        recipient = zap.reporter.parse_recipient({"to": "nikola.tesla@mail.com", "chargers": "NP10"})
+
+        # Verify that a single charger is matched exactly, rather than as a part of a longer name.
+        assert ["NP10"] == recipient.chargers
+        assert None is recipient.installations
+        usage = zap.reporter.zusage.Usage(
+            {"Charger": ["NP1", "P1", "NP10"], "Energy": [1.0, 2.0, 3.0], "Duration": [0, 0, 0], "Sessions": [1, 1, 1]}
+        )
+        assert ["NP10"] == [row["Charger"] for row in recipient.filter_usage(usage)]
+
+    def test_invalid_names(self):
+        with pytest.raises(ValueError):
+            zap.reporter.parse_recipient({"to": "nikola.tesla@mail.com", "chargers": [10]})
+
+    def test_no_addresses(self):
+        with pytest.raises(ValueError):
+            zap.reporter.parse_recipient({"name": "Tesla", "chargers": ["NP1"]})
+
 
 class TestReporter:
     @pytest.fixture
@@ -226,3 +309,414 @@ class TestReporter:
         assert sent_msg["To"] == "thomas.edison@mail.com, joseph.swan@mail.com"
         assert sent_msg["Cc"] == "michael.faraday@mail.com, benjamin.franklin@mail.com"
         assert sent_msg["Bcc"] == "thales@mail.com"
+
+
+class TestFetchUsageData:
+    ACCESS_TOKEN = "blablaiamatokenblablabla"
+
+    @responses.activate
+    def test_concurrent_fetch_keeps_order(self, mock_report):
+        installation_ids = [f"installation-{i}" for i in range(8)]
+        for i, installation_id in enumerate(installation_ids):
+            mock_report(installation_id, f"Installation {i}", f"Charger {i}")
+
+        api = zap.reporter.zapi.ZaptecAPI(self.ACCESS_TOKEN)
+        usage_data = zap.reporter.fetch_usage_data(
+            api, installation_ids, datetime(2024, 12, 1), datetime(2025, 1, 1), concurrency=4
+        )
+
+        # Verify that usage is aggregated in the order of the installation IDs.
+        assert [usage["Charger"] for usage in usage_data["Usage"]] == [f"Charger {i}" for i in range(8)]
+        assert [usage["Installation"] for usage in usage_data["Usage"]] == [f"Installation {i}" for i in range(8)]
+
+    @responses.activate
+    def test_concurrent_fetch_failure(self, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+        mock_report("bbbb-bbb-bbbb", "Installation B", "VP1", status=500)
+        mock_report("cccc-ccc-cccc", "Installation C", "HP1")
+
+        api = zap.reporter.zapi.ZaptecAPI(self.ACCESS_TOKEN)
+        with pytest.raises(zap.reporter.FetchError) as excinfo:
+            zap.reporter.fetch_usage_data(
+                api,
+                ["aaaa-aaa-aaaa", "bbbb-bbb-bbbb", "cccc-ccc-cccc"],
+                datetime(2024, 12, 1),
+                datetime(2025, 1, 1),
+                concurrency=3,
+            )
+
+        # Verify that the failed installation is reported and that the successful reports are kept.
+        assert list(excinfo.value.errors) == ["bbbb-bbb-bbbb"]
+        assert list(excinfo.value.reports) == ["aaaa-aaa-aaaa", "cccc-ccc-cccc"]
+        assert "bbbb-bbb-bbbb" in str(excinfo.value)
+        assert "bbbb-bbb-bbbb" == excinfo.value.usage_data["Metadata"]["Failed"]
+        assert ["NP1", "HP1"] == [usage["Charger"] for usage in excinfo.value.usage_data["Usage"]]
+
+    @pytest.mark.parametrize("excel_writer", ["pandas", "streaming"])
+    @responses.activate
+    def test_partial_report(self, tmp_path, excel_writer, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+        mock_report("bbbb-bbb-bbbb", "Installation B", "VP1", status=500)
+
+        with pytest.raises(zap.reporter.FetchError):
+            zap.main(
+                (
+                    f"-p {self.ACCESS_TOKEN} --no-cache report -o {tmp_path / 'usage.ndjson'} "
+                    f"-x {tmp_path / 'report.xlsx'} --excel-writer {excel_writer} --archive {tmp_path / 'archive'} "
+                    "--from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa bbbb-bbb-bbbb"
+                ).split()
+            )
+
+        # Verify that the usage that was fetched is still written, but that the incomplete report is not archived.
+        assert "NP1" == json.loads((tmp_path / "usage.ndjson").read_text())["Charger"]
+        assert not (tmp_path / "archive").exists()
+
+        # Verify that the workbook lists the installations that failed.
+        worksheet = openpyxl.load_workbook(tmp_path / "report.xlsx").worksheets[0]
+        rows = [[cell.value for cell in row] for row in worksheet.iter_rows()]
+        assert ["Failed", "bbbb-bbb-bbbb"] in [row[:2] for row in rows]
+        assert "NP1" in [row[0] for row in rows]
+
+    @responses.activate
+    def test_all_installations(self, tmp_path, mock_report):
+        responses.get(
+            "https://api.zaptec.com/api/installation",
+            json={
+                "Pages": 1,
+                "Data": [
+                    {"Id": "aaaa-aaa-aaaa", "Name": "Installation A"},
+                    {"Id": "bbbb-bbb-bbbb", "Name": "Installation B"},
+                ],
+            },
+        )
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+        mock_report("bbbb-bbb-bbbb", "Installation B", "VP1")
+
+        # Trigger report for all installations.
+        filepath = tmp_path / "report.xlsx"
+        zap.main(
+            (
+                f"-p {self.ACCESS_TOKEN} --no-cache report -x {filepath} "
+                f"--from-date 2024-12 --to-date 2025-01 --all-installations"
+            ).split()
+        )
+
+        # Verify that usage from all installations was included.
+        worksheet = openpyxl.load_workbook(filepath).worksheets[0]
+        assert worksheet["A7"].value == "NP1"
+        assert worksheet["A8"].value == "VP1"
+
+    def test_split_months(self):
+        assert zap.reporter.split_months(datetime(2024, 11, 15), datetime(2025, 2, 1)) == [
+            (datetime(2024, 11, 15), datetime(2024, 12, 1)),
+            (datetime(2024, 12, 1), datetime(2025, 1, 1)),
+            (datetime(2025, 1, 1), datetime(2025, 2, 1)),
+        ]
+        assert zap.reporter.split_months(datetime(2024, 12, 1), datetime(2024, 12, 20)) == [
+            (datetime(2024, 12, 1), datetime(2024, 12, 20)),
+        ]
+
+    @responses.activate
+    def test_split_by_month(self, mock_month):
+        mock_month("2024-11-01T00:00:00", "2024-12-01T00:00:00", [("NP1", 3, 100.1, 10.5), ("NP2", 1, 5.0, 1.0)])
+        mock_month("2024-12-01T00:00:00", "2025-01-01T00:00:00", [("NP2", 2, 7.2, 2.25), ("NP1", 8, 172.697, 1.0)])
+
+        # Fetch two months, one month at a time.
+        api = zap.reporter.zapi.ZaptecAPI(self.ACCESS_TOKEN)
+        usage_data = zap.reporter.fetch_usage_data(
+            api, ["aaaa-aaa-aaaa"], datetime(2024, 11, 1), datetime(2025, 1, 1), concurrency=2, split_by_month=True
+        )
+
+        # Verify that the months were merged into the same rows as a single request would give.
+        assert 2 == len(responses.calls)
+        assert usage_data["Metadata"]["From"] == datetime(2024, 11, 1)
+        assert usage_data["Metadata"]["To"] == datetime(2025, 1, 1)
+        assert usage_data["Usage"] == [
+            {
+                "Charger": "NP1",
+                "Energy": 272.797,
+                "Duration": "0 days 11:30:00",
+                "Sessions": 11,
+                "Installation": "Installation A",
+            },
+            {
+                "Charger": "NP2",
+                "Energy": 12.2,
+                "Duration": "0 days 03:15:00",
+                "Sessions": 3,
+                "Installation": "Installation A",
+            },
+        ]
+
+    @responses.activate
+    def test_output_files(self, tmp_path, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+
+        # Trigger report with templated output paths, but without an Excel report.
+        filepath = tmp_path / "usage_{{Metadata.From.strftime('%Y_%m')}}"
+        zap.main(
+            (
+                f"-p {self.ACCESS_TOKEN} --no-cache report -o {filepath}.csv -o {filepath}.ndjson "
+                "--from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa"
+            ).split()
+        )
+
+        # Verify that both files were written.
+        assert (
+            "Charger,Energy,Duration,Sessions,Installation" == (tmp_path / "usage_2024_12.csv").read_text().split()[0]
+        )
+        assert "NP1" == json.loads((tmp_path / "usage_2024_12.ndjson").read_text())["Charger"]
+
+    @pytest.mark.parametrize("excel_writer", ["pandas", "streaming"])
+    @responses.activate
+    def test_group_by_views(self, tmp_path, excel_writer, installation_report, mock_report):
+        for group_by, grouped_by, group in [("CHARGER", "Charger", "NP1"), ("USER", "User", "Thomas Edison")]:
+            for installation_id in ["aaaa-aaa-aaaa", "bbbb-bbb-bbbb"]:
+                report = installation_report(
+                    f"Installation {installation_id[0].upper()}", [(group, 1, 10.0, 1.0)], grouped_by=grouped_by
+                )
+                mock_report(
+                    installation_id, report=report, groupBy=zap.reporter.zapi.InstallationGroupBy[group_by].value
+                )
+
+        zap.main(
+            (
+                f"-p {self.ACCESS_TOKEN} --no-cache report -x {tmp_path / 'report.xlsx'} --excel-writer {excel_writer} "
+                "--group-by charger --group-by user --from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa bbbb-bbb-bbbb"
+            ).split()
+        )
+
+        # Verify that every installation was fetched once per grouping, and that every grouping got its own sheet.
+        assert 4 == len(responses.calls)
+        workbook = openpyxl.load_workbook(tmp_path / "report.xlsx")
+        assert ["Charger", "User"] == workbook.sheetnames
+        assert ["Charger", "NP1", "NP1"] == [workbook["Charger"][f"A{row}"].value for row in range(6, 9)]
+        assert ["User", "Thomas Edison", "Thomas Edison"] == [workbook["User"][f"A{row}"].value for row in range(6, 9)]
+
+    @responses.activate
+    def test_archive(self, tmp_path, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+
+        zap.main(
+            (
+                f"-p {self.ACCESS_TOKEN} --no-cache report -x {tmp_path / 'report.xlsx'} "
+                f"--archive {tmp_path / 'archive'} --from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa"
+            ).split()
+        )
+
+        # Verify that the archived report is the very same report as the one written to file.
+        (archived,) = (tmp_path / "archive").glob("*/*")
+        assert "2024-12-01_2025-01-01" == archived.parent.name
+        assert archived.name.startswith("usage_report_") and archived.suffix == ".xlsx"
+        assert (tmp_path / "report.xlsx").read_bytes() == archived.read_bytes()
+
+    @responses.activate
+    def test_batch(self, tmp_path, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+        mock_report("bbbb-bbb-bbbb", "Installation B", "VP1")
+        mock_report("cccc-ccc-cccc", "Installation C", "HP1")
+
+        # Prepare three jobs with overlapping installations and periods.
+        batch_path = tmp_path / "batch.yml"
+        with open(batch_path, "w") as f:
+            yaml.dump(
+                [
+                    {
+                        "name": "A and B",
+                        "installations": ["aaaa-aaa-aaaa", "bbbb-bbb-bbbb"],
+                        "from-date": "2024-12",
+                        "to-date": "2025-01",
+                        "output": str(tmp_path / "ab.csv"),
+                    },
+                    {
+                        "name": "B and C",
+                        "installations": ["bbbb-bbb-bbbb", "cccc-ccc-cccc"],
+                        "from-date": "2024-12",
+                        "to-date": "2025-01",
+                        "excelout": str(tmp_path / "bc.xlsx"),
+                        "excel-writer": "streaming",
+                    },
+                    {
+                        "name": "C",
+                        "installations": "cccc-ccc-cccc",
+                        "from-date": "2024-12",
+                        "to-date": "2025-01",
+                        "output": [str(tmp_path / "c.ndjson")],
+                    },
+                ],
+                f,
+            )
+
+        zap.main(f"-p {self.ACCESS_TOKEN} --no-cache batch -c 2 {batch_path}".split())
+
+        # Verify that every installation report was fetched once, and fanned out to every job.
+        assert 3 == len(responses.calls)
+        assert ["NP1", "VP1"] == [line.split(",")[0] for line in (tmp_path / "ab.csv").read_text().splitlines()[1:]]
+        worksheet = openpyxl.load_workbook(tmp_path / "bc.xlsx").worksheets[0]
+        assert ["VP1", "HP1"] == [worksheet["A7"].value, worksheet["A8"].value]
+        assert "HP1" == json.loads((tmp_path / "c.ndjson").read_text())["Charger"]
+
+    @responses.activate
+    def test_batch_split_months(self, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+
+        # Plan two jobs, where the shorter period is a part of the longer one.
+        jobs = [
+            zap.reporter.BatchJob("Quarter", ["aaaa-aaa-aaaa"], datetime(2024, 10, 1), datetime(2025, 1, 1)),
+            zap.reporter.BatchJob("December", ["aaaa-aaa-aaaa"], datetime(2024, 12, 1), datetime(2025, 1, 1)),
+        ]
+        for job in jobs:
+            job.split_by_month = True
+            job.output_paths = []
+
+        api = zap.reporter.zapi.ZaptecAPI(self.ACCESS_TOKEN)
+        zap.reporter.batch(api, jobs, concurrency=2)
+
+        # Verify that the shared month was only fetched once.
+        assert 3 == len(responses.calls)
+
+    @responses.activate
+    def test_batch_failure(self, tmp_path, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+        mock_report("bbbb-bbb-bbbb", "Installation B", "VP1", status=500)
+
+        jobs = [
+            zap.reporter.BatchJob("A", ["aaaa-aaa-aaaa"], datetime(2024, 12, 1), datetime(2025, 1, 1)),
+            zap.reporter.BatchJob("B", ["bbbb-bbb-bbbb"], datetime(2024, 12, 1), datetime(2025, 1, 1)),
+            zap.reporter.BatchJob("A again", ["aaaa-aaa-aaaa"], datetime(2024, 12, 1), datetime(2025, 1, 1)),
+        ]
+        jobs[2].output_paths = [str(tmp_path / "a.csv")]
+
+        api = zap.reporter.zapi.ZaptecAPI(self.ACCESS_TOKEN)
+        with pytest.raises(zap.reporter.BatchError) as excinfo:
+            zap.reporter.batch(api, jobs)
+
+        # Verify that the failed job is reported, and that the jobs after it were still run.
+        assert ["B"] == list(excinfo.value.errors)
+        assert (tmp_path / "a.csv").exists()
+
+    @responses.activate
+    def test_batch_plan_and_render_failure(self, tmp_path, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+
+        jobs = [
+            zap.reporter.BatchJob("Bad date", ["aaaa-aaa-aaaa"], "sometime", datetime(2025, 1, 1)),
+            zap.reporter.BatchJob(
+                "Bad writer",
+                ["aaaa-aaa-aaaa"],
+                datetime(2024, 12, 1),
+                datetime(2025, 1, 1),
+                excel_path=str(tmp_path / "a.xlsx"),
+                excel_writer="quill",
+            ),
+            zap.reporter.BatchJob(
+                "A",
+                ["aaaa-aaa-aaaa"],
+                datetime(2024, 12, 1),
+                datetime(2025, 1, 1),
+                output_paths=[str(tmp_path / "a.csv")],
+            ),
+        ]
+
+        api = zap.reporter.zapi.ZaptecAPI(self.ACCESS_TOKEN)
+        with pytest.raises(zap.reporter.BatchError) as excinfo:
+            zap.reporter.batch(api, jobs)
+
+        # Verify that jobs failing to plan or render are reported, and that the other jobs were still run.
+        assert ["Bad date", "Bad writer"] == list(excinfo.value.errors)
+        assert (tmp_path / "a.csv").exists()
+
+    @responses.activate
+    def test_daemon_keeps_running(self, tmp_path, mock_report):
+        responses.get("https://api.zaptec.com/api/installation", status=500)
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+
+        jobs = [
+            zap.reporter.BatchJob("All", [], datetime(2024, 12, 1), datetime(2025, 1, 1), all_installations=True),
+            zap.reporter.BatchJob(
+                "A",
+                ["aaaa-aaa-aaaa"],
+                datetime(2024, 12, 1),
+                datetime(2025, 1, 1),
+                output_paths=[str(tmp_path / "a.csv")],
+            ),
+        ]
+
+        class Scheduler:
+            # Run the jobs one at a time, as if they were due at different times.
+            def __init__(self, jobs):
+                self.jobs = jobs
+
+            def stop(self, *args):
+                pass
+
+            def run(self, run_jobs):
+                for _, job in self.jobs:
+                    run_jobs([job])
+
+        api = zap.reporter.zapi.ZaptecAPI(self.ACCESS_TOKEN)
+        zap.reporter.zmetrics.configure(json_file=tmp_path / "metrics.json")
+        try:
+            with patch.object(zap.reporter.zschedule, "Scheduler", Scheduler), patch("signal.signal"):
+                zap.reporter.daemon(api, jobs)
+        finally:
+            zap.reporter.zmetrics.configure()
+
+        # Verify that a failure to fetch installations did not stop the daemon from running the next job.
+        assert (tmp_path / "a.csv").exists()
+        assert json.loads((tmp_path / "metrics.json").read_text())["success"]
+
+    def test_date_range(self, tmp_path):
+        # Verify that empty periods are rejected up front, rather than when reports are collected.
+        with pytest.raises(SystemExit):
+            zap.main(f"-p {self.ACCESS_TOKEN} --no-cache report --from-date 2025-01 --to-date 2025-01 aaaa".split())
+
+        batch_path = tmp_path / "batch.yml"
+        with open(batch_path, "w") as f:
+            yaml.dump([{"name": "Backwards", "installations": "aaaa", "from-date": "this month", "to-date": "2024"}], f)
+
+        with pytest.raises(ValueError, match="Backwards"):
+            zap.reporter.parse_batch_config(batch_path)
+
+    def test_daemon_needs_schedules(self, tmp_path):
+        batch_path = tmp_path / "batch.yml"
+        with open(batch_path, "w") as f:
+            yaml.dump(
+                [
+                    {"name": "Monthly", "installations": "aaaa-aaa-aaaa", "schedule": "0 7 1 * *"},
+                    {"name": "Unscheduled", "installations": "aaaa-aaa-aaaa"},
+                ],
+                f,
+            )
+
+        # Verify that jobs are parsed with their schedules, and that relative dates are kept until they are run.
+        jobs = zap.reporter.parse_batch_config(batch_path)
+        assert "0 7 1 * *" == str(jobs[0].schedule)
+        assert "last month" == jobs[0].from_date
+        assert None is jobs[1].schedule
+
+        with pytest.raises(SystemExit):
+            zap.main(f"-p {self.ACCESS_TOKEN} --no-cache daemon {batch_path}".split())
+
+    @responses.activate
+    def test_sessions(self, tmp_path):
+        for installation_id in ["aaaa-aaa-aaaa", "bbbb-bbb-bbbb"]:
+            responses.get(
+                "https://api.zaptec.com/api/chargehistory",
+                json={"Pages": 1, "Data": [{"Id": f"{installation_id}-session", "Energy": 1.5}]},
+                match=[responses.matchers.query_param_matcher({"InstallationId": installation_id}, strict_match=False)],
+            )
+
+        # Export sessions from two installations to a templated path.
+        filepath = tmp_path / "sessions_{{Metadata.From.strftime('%Y_%m')}}.ndjson"
+        zap.main(
+            (
+                f"-p {self.ACCESS_TOKEN} --no-cache sessions -o {filepath} "
+                "--from-date 2024-12 --to-date 2025-01 aaaa-aaa-aaaa bbbb-bbb-bbbb"
+            ).split()
+        )
+
+        # Verify that sessions from both installations were written.
+        assert ["aaaa-aaa-aaaa-session", "bbbb-bbb-bbbb-session"] == [
+            json.loads(line)["Id"] for line in (tmp_path / "sessions_2024_12.ndjson").read_text().splitlines()
+        ]
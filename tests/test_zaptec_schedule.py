@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from zaptec_reporter import schedule as zschedule
+
+
+class TestCronSchedule:
+    def test_monthly(self):
+        schedule = zschedule.CronSchedule("0 7 1 * *")
+
+        assert datetime(2025, 1, 1, 7, 0) == schedule.next(datetime(2024, 12, 1, 7, 0))
+        assert datetime(2024, 12, 1, 7, 0) == schedule.next(datetime(2024, 11, 30, 23, 59, 59))
+
+    def test_steps_and_ranges(self):
+        schedule = zschedule.CronSchedule("*/20 8-10,14 * * *")
+
+        assert datetime(2024, 12, 1, 8, 20) == schedule.next(datetime(2024, 12, 1, 8, 0))
+        assert datetime(2024, 12, 1, 14, 0) == schedule.next(datetime(2024, 12, 1, 10, 40))
+        assert datetime(2024, 12, 2, 8, 0) == schedule.next(datetime(2024, 12, 1, 14, 40))
+
+    def test_weekdays(self):
+        # Sunday is both 0 and 7, and 2024-12-01 is a Sunday.
+        assert datetime(2024, 12, 8) == zschedule.CronSchedule("0 0 * * 7").next(datetime(2024, 12, 1))
+        assert datetime(2024, 12, 1) == zschedule.CronSchedule("@weekly").next(datetime(2024, 11, 30))
+
+        # Just like cron, a restricted day and a restricted weekday match either.
+        schedule = zschedule.CronSchedule("0 0 15 * 1")
+        assert datetime(2024, 12, 2) == schedule.next(datetime(2024, 12, 1))
+        assert datetime(2024, 12, 15) == schedule.next(datetime(2024, 12, 9))
+
+    def test_leap_day(self):
+        assert datetime(2028, 2, 29) == zschedule.CronSchedule("0 0 29 2 *").next(datetime(2024, 3, 1))
+
+    @pytest.mark.parametrize("expression", ["0 7 1 *", "60 * * * *", "0 0 30 2 *", "0 0 * * mon", "5-1 * * * *"])
+    def test_invalid(self, expression):
+        with pytest.raises(ValueError):
+            zschedule.CronSchedule(expression)
+
+
+class FakeScheduler(zschedule.Scheduler):
+    # Scheduler with a fake clock, where waiting moves the clock forward instead of sleeping.
+    def __init__(self, jobs, now, stop_at):
+        super().__init__(jobs, clock=lambda: self.now)
+        self.now = now
+        self.stop_at = stop_at
+        self.waits = []
+
+    def wait(self, seconds):
+        self.waits.append(seconds)
+        self.now += timedelta(seconds=seconds)
+        return self.now >= self.stop_at
+
+
+class TestScheduler:
+    def test_run(self):
+        hourly = zschedule.CronSchedule("0 * * * *")
+        half_hourly = zschedule.CronSchedule("*/30 * * * *")
+        scheduler = FakeScheduler(
+            [(hourly, "hourly"), (half_hourly, "half-hourly")], datetime(2024, 12, 1, 0, 10), datetime(2024, 12, 1, 2)
+        )
+
+        runs = []
+        scheduler.run(lambda jobs: runs.append((scheduler.now, jobs)))
+
+        # Verify that jobs due at the same time are run together.
+        assert [
+            (datetime(2024, 12, 1, 0, 30), ["half-hourly"]),
+            (datetime(2024, 12, 1, 1, 0), ["hourly", "half-hourly"]),
+            (datetime(2024, 12, 1, 1, 30), ["half-hourly"]),
+        ] == runs
+
+    def test_no_overlapping_runs(self):
+        scheduler = FakeScheduler(
+            [(zschedule.CronSchedule("*/10 * * * *"), "job")], datetime(2024, 12, 1), datetime(2024, 12, 1, 1)
+        )
+
+        def run(jobs):
+            # A run that takes longer than the schedule interval.
+            runs.append(scheduler.now)
+            scheduler.now += timedelta(minutes=25)
+
+        runs = []
+        scheduler.run(run)
+
+        # Verify that runs missed while running were skipped rather than run late.
+        assert [datetime(2024, 12, 1, 0, 10), datetime(2024, 12, 1, 0, 40)] == runs
+
+    def test_stop(self):
+        scheduler = zschedule.Scheduler([(zschedule.CronSchedule("@yearly"), "job")])
+        scheduler.stop()
+
+        runs = []
+        scheduler.run(runs.append)
+
+        assert [] == runs
@@ -0,0 +1,140 @@
+import concurrent.futures
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import openpyxl
+import pytest
+import responses
+
+from zaptec_reporter import api as zapi
+from zaptec_reporter import server as zserver
+
+
+@pytest.fixture
+def report_server():
+    service = zserver.ReportService(zapi.ZaptecAPI("token"), excel_writer="streaming")
+    server = zserver.ReportServer(("127.0.0.1", 0), service, workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path):
+    # Requests to the report server are made with urllib, as only requests to Zaptec Cloud are mocked.
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}{path}") as response:
+            return response.status, response.headers["Content-Type"], response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["Content-Type"], e.read()
+
+
+class TestCoalescer:
+    def test_coalesce(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch(key):
+            calls.append(key)
+            started.set()
+            release.wait()
+            return key.upper()
+
+        coalescer = zserver.Coalescer(fetch)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(coalescer.get, ("a",))
+            started.wait()
+            others = [executor.submit(coalescer.get, ("a",)) for _ in range(3)]
+            release.set()
+
+        # Verify that identical requests in flight shared one call.
+        assert ["A"] * 4 == [future.result() for future in [first, *others]]
+        assert ["a"] == calls
+
+    def test_lru(self):
+        calls = []
+        coalescer = zserver.Coalescer(lambda key: calls.append(key) or key, max_entries=2)
+        for key in ["a", "b", "a", "c", "a", "b"]:
+            coalescer.get((key,))
+
+        # Verify that the least recently used result was evicted.
+        assert ["a", "b", "c", "b"] == calls
+
+    def test_ttl(self):
+        calls = []
+        coalescer = zserver.Coalescer(lambda key: calls.append(key) or key, ttl=0)
+        coalescer.get(("a",))
+        coalescer.get(("a",))
+
+        assert ["a", "a"] == calls
+
+    def test_failure_not_kept(self):
+        calls = []
+
+        def fetch(key):
+            calls.append(key)
+            raise RuntimeError("Zaptec Cloud is down.")
+
+        coalescer = zserver.Coalescer(fetch)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                coalescer.get(("a",))
+
+        assert ["a", "a"] == calls
+
+
+class TestServer:
+    @responses.activate
+    def test_formats(self, report_server, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+        mock_report("bbbb-bbb-bbbb", "Installation B", "VP1")
+        query = "installation=aaaa-aaa-aaaa&installation=bbbb-bbb-bbbb&from=2024-12&to=2025-01"
+
+        status, content_type, body = get(report_server, f"/report.json?{query}")
+        assert 200 == status
+        assert "application/json" == content_type
+        assert ["NP1", "VP1"] == [usage["Charger"] for usage in json.loads(body)["Usage"]]
+        assert "2024-12-01T00:00:00" == json.loads(body)["Metadata"]["From"]
+
+        status, content_type, body = get(report_server, f"/report.csv?{query}")
+        assert "text/csv; charset=utf-8" == content_type
+        assert ["Charger", "NP1", "VP1"] == [line.split(",")[0] for line in body.decode().splitlines()]
+
+        status, content_type, body = get(report_server, f"/report.xlsx?{query}")
+        worksheet = openpyxl.load_workbook(io.BytesIO(body)).worksheets[0]
+        assert ["NP1", "VP1"] == [worksheet["A7"].value, worksheet["A8"].value]
+
+        # Verify that usage was fetched once for all formats.
+        assert 2 == len(responses.calls)
+
+    @responses.activate
+    def test_concurrent_requests(self, report_server, mock_report):
+        mock_report("aaaa-aaa-aaaa", "Installation A", "NP1")
+
+        # Relative and absolute dates resolve to the same report.
+        last_month = f"{datetime.now().replace(day=1) - timedelta(days=1):%Y-%m}"
+        paths = [f"/report?installation=aaaa-aaa-aaaa&from={date}" for date in ["last%20month", last_month] * 4]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda path: get(report_server, path), paths))
+
+        assert {200} == {status for status, _, _ in results}
+        assert 1 == len({body for _, _, body in results})
+        assert 1 == len(responses.calls)
+
+    @responses.activate
+    def test_errors(self, report_server, mock_report):
+        mock_report("aaaa-aaa-aaaa", status=500)
+
+        assert 404 == get(report_server, "/installations")[0]
+        assert 404 == get(report_server, "/report.pdf?installation=aaaa-aaa-aaaa")[0]
+        assert 400 == get(report_server, "/report")[0]
+        assert 400 == get(report_server, "/report?installation=aaaa-aaa-aaaa&from=zap")[0]
+        assert 400 == get(report_server, "/report?installation=aaaa-aaa-aaaa&group_by=zap")[0]
+        assert 400 == get(report_server, "/report?installation=aaaa-aaa-aaaa&from=2025-01&to=2024-12")[0]
+        assert 502 == get(report_server, "/report?installation=aaaa-aaa-aaaa")[0]
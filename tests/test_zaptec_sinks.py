@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from zaptec_reporter import sinks as zsinks
+from zaptec_reporter import usage as zusage
+
+
+class TestSinks:
+    DATA = {
+        "Usage": [
+            {"Charger": "NP1", "Energy": 272.797, "Duration": "11 days 15:01:43", "Sessions": 11, "Installation": "A"},
+            {"Charger": "VP1", "Energy": 43.114, "Duration": "0 days 10:30:00", "Sessions": 2, "Installation": "B"},
+        ],
+        "Metadata": {"From": datetime(2024, 12, 1), "To": datetime(2025, 1, 1)},
+    }
+
+    def test_csv(self, tmp_path):
+        path = tmp_path / "usage.csv"
+        zsinks.write_usage(self.DATA, path)
+
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        assert ["Charger", "Energy", "Duration", "Sessions", "Installation"] == list(rows[0])
+        assert "VP1" == rows[1]["Charger"]
+        assert "43.114" == rows[1]["Energy"]
+        assert "0 days 10:30:00" == rows[1]["Duration"]
+
+    def test_ndjson(self, tmp_path):
+        path = tmp_path / "usage.jsonl"
+        zsinks.write_usage(self.DATA, path)
+
+        assert self.DATA["Usage"] == [json.loads(line) for line in path.read_text().splitlines()]
+
+    def test_parquet(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        # Write with an explicit format and small row groups.
+        path = tmp_path / "usage.out"
+        columns, rows = zusage.usage_table(self.DATA["Usage"])
+        zsinks.write_parquet(rows, path, columns, row_group_size=1)
+
+        parquet_file = pq.ParquetFile(path)
+        assert 2 == parquet_file.num_row_groups
+        assert self.DATA["Usage"] == parquet_file.read().to_pylist()
+
+    def test_output_format(self):
+        assert zsinks.OutputFormat.NDJSON == zsinks.detect_output_format("usage.ndjson")
+        assert zsinks.OutputFormat.CSV == zsinks.detect_output_format("usage.txt", "csv")
+        with pytest.raises(ValueError):
+            zsinks.detect_output_format("usage.txt")
+
+    def test_records(self, tmp_path):
+        def records():
+            yield {"Id": "session-1", "Energy": 1.5, "StartDateTime": "2024-12-01T10:00:00"}
+            yield {"Id": "session-2", "StartDateTime": "2024-12-02T10:00:00", "Extra": True}
+            yield {"Id": "session-3", "UserEmail": "nikola.tesla@mail.com", "Late": 1}
+
+        path = tmp_path / "sessions.csv"
+        zsinks.write_records(records(), path, columns=["Id", "UserEmail"], sample_size=2)
+
+        # Verify that the given columns come first, followed by the fields of the first records.
+        with open(path, newline="") as f:
+            assert [
+                ["Id", "UserEmail", "Energy", "StartDateTime", "Extra"],
+                ["session-1", "", "1.5", "2024-12-01T10:00:00", ""],
+                ["session-2", "", "", "2024-12-02T10:00:00", "True"],
+                ["session-3", "nikola.tesla@mail.com", "", "", ""],
+            ] == list(csv.reader(f))
+
+    def test_records_nested(self, tmp_path):
+        records = [{"Id": "session-1", "EnergyDetails": [{"Energy": 1.0, "Timestamp": "2024-12-01T10:00:00"}]}]
+
+        path = tmp_path / "sessions.csv"
+        zsinks.write_records(records, path)
+
+        # Verify that nested fields are written as JSON, rather than as Python objects.
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert records[0]["EnergyDetails"] == json.loads(rows[0]["EnergyDetails"])
+
+    def test_records_null_first(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        def records():
+            yield {"Id": "session-1", "UserEmail": None, "Energy": None}
+            yield {"Id": "session-2", "UserEmail": "nikola.tesla@mail.com", "Energy": 1.5}
+
+        # Verify that fields which are null throughout the first row group are written as text.
+        zsinks.write_records(records(), tmp_path / "sessions.parquet")
+        table = pq.read_table(tmp_path / "sessions.parquet")
+        assert [None, "nikola.tesla@mail.com"] == table.column("UserEmail").to_pylist()
+        assert [None, 1.5] == table.column("Energy").to_pylist()
+
+        rows = (tuple(record.values()) for record in records())
+        zsinks.write_parquet(rows, tmp_path / "small.parquet", ["Id", "UserEmail", "Energy"], row_group_size=1)
+        table = pq.read_table(tmp_path / "small.parquet")
+        assert [None, "nikola.tesla@mail.com"] == table.column("UserEmail").to_pylist()
+        assert [None, "1.5"] == table.column("Energy").to_pylist()
+
+    def test_no_records(self, tmp_path):
+        path = tmp_path / "sessions.ndjson"
+        zsinks.write_records(iter([]), path)
+
+        assert "" == path.read_text()
+
+    def test_report_view(self, tmp_path):
+        buffer = io.BytesIO(b"report")
+        with zsinks.report_view(buffer) as view:
+            assert view.readonly
+            with pytest.raises(TypeError):
+                view[0] = 0
+
+            zsinks.write_report_file(view, tmp_path / "report.xlsx")
+            path = zsinks.archive_report(
+                view, tmp_path, {"From": datetime(2024, 12, 1), "To": datetime(2025, 1, 1), "Generated": datetime.now()}
+            )
+
+        # Verify that both sinks got the report, and that the buffer is released once done.
+        assert b"report" == (tmp_path / "report.xlsx").read_bytes() == path.read_bytes()
+        buffer.write(b"!")
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import pytest
+import responses
+
+from zaptec_reporter import api as zapi
+from zaptec_reporter import reporter as zreporter
+from zaptec_reporter import store as zstore
+
+
+def request_json(date_from, date_to, installation_id="aaaa-aaa-aaaa"):
+    return {
+        "fromDate": date_from,
+        "endDate": date_to,
+        "installationId": installation_id,
+        "groupBy": zapi.InstallationGroupBy.CHARGER.value,
+    }
+
+
+class TestUsageStore:
+    def test_put_get(self, tmp_path, installation_report):
+        report = installation_report(entries=[("NP2", 2, 7.2, 2.25), ("NP1", 8, 172.697, 1.0)])
+
+        with zstore.UsageStore(tmp_path / "usage.db") as store:
+            assert None is store.get(request_json("2024-12-01T00:00:00", "2025-01-01T00:00:00"))
+            store.put(request_json("2024-12-01T00:00:00", "2025-01-01T00:00:00"), report)
+
+        # Verify that reports are kept between runs, in their original order.
+        with zstore.UsageStore(tmp_path / "usage.db") as store:
+            assert report == store.get(request_json("2024-12-01T00:00:00", "2025-01-01T00:00:00"))
+            assert store.covers(
+                "aaaa-aaa-aaaa", "2024-12-01T00:00:00", "2025-01-01T00:00:00", zapi.InstallationGroupBy.CHARGER
+            )
+            assert not store.covers(
+                "aaaa-aaa-aaaa", "2024-12-01T00:00:00", "2025-01-01T00:00:00", zapi.InstallationGroupBy.USER
+            )
+
+    def test_upsert(self, tmp_path, installation_report):
+        with zstore.UsageStore(tmp_path / "usage.db") as store:
+            store.put(
+                request_json("2024-12-01T00:00:00", "2025-01-01T00:00:00"),
+                installation_report(entries=[("NP1", 1, 1.0, 1.0), ("NP2", 1, 1.0, 1.0)]),
+            )
+            report = installation_report(entries=[("NP1", 2, 2.0, 2.0)])
+            store.put(request_json("2024-12-01T00:00:00", "2025-01-01T00:00:00"), report)
+
+            assert report == store.get(request_json("2024-12-01T00:00:00", "2025-01-01T00:00:00"))
+            assert 1 == store.connection.execute("SELECT COUNT(*) FROM usage").fetchone()[0]
+
+    def test_bind(self, tmp_path):
+        with zstore.UsageStore(tmp_path / "usage.db") as store:
+            store.bind("https://api.zaptec.com")
+
+        # Verify that a store is only used with the API its reports were fetched from.
+        with zstore.UsageStore(tmp_path / "usage.db") as store:
+            store.bind("https://api.zaptec.com")
+            with pytest.raises(ValueError):
+                zapi.ZaptecAPI(usage_store=store, base_url="http://localhost:8080")
+
+    def test_open_period(self, tmp_path, installation_report):
+        date_to = datetime(datetime.now().year + 1, 1, 1).isoformat()
+
+        # Verify that periods that are still in progress are not stored.
+        with zstore.UsageStore(tmp_path / "usage.db") as store:
+            store.put(request_json("2024-12-01T00:00:00", date_to), installation_report(entries=[], date_to=date_to))
+            assert None is store.get(request_json("2024-12-01T00:00:00", date_to))
+
+    @responses.activate
+    def test_fill_gaps(self, tmp_path, mock_month):
+        mock_month("2024-10-01T00:00:00", "2024-11-01T00:00:00", [("NP1", 1, 10.0, 1.0)])
+        mock_month("2024-11-01T00:00:00", "2024-12-01T00:00:00", [("NP1", 3, 100.1, 10.5), ("NP2", 1, 5.0, 1.0)])
+        mock_month("2024-12-01T00:00:00", "2025-01-01T00:00:00", [("NP2", 2, 7.2, 2.25), ("NP1", 8, 172.697, 1.0)])
+
+        with zstore.UsageStore(tmp_path / "usage.db") as store:
+            api = zapi.ZaptecAPI("token", usage_store=store)
+
+            # Store November.
+            zreporter.fetch_usage_data(api, ["aaaa-aaa-aaaa"], datetime(2024, 11, 1), datetime(2024, 12, 1))
+            assert 1 == len(responses.calls)
+
+            # Verify that only the months missing from the store are fetched.
+            usage_data = zreporter.fetch_usage_data(api, ["aaaa-aaa-aaaa"], datetime(2024, 10, 1), datetime(2025, 1, 1))
+            assert 3 == len(responses.calls)
+
+            # Verify that a covered period is answered from the store alone.
+            stored_usage_data = zreporter.fetch_usage_data(
+                api, ["aaaa-aaa-aaaa"], datetime(2024, 10, 1), datetime(2025, 1, 1)
+            )
+            assert 3 == len(responses.calls)
+
+        assert usage_data["Usage"] == stored_usage_data["Usage"]
+        assert datetime(2024, 10, 1) == stored_usage_data["Metadata"]["From"]
+        assert datetime(2025, 1, 1) == stored_usage_data["Metadata"]["To"]
+        assert [("NP1", 12, pytest.approx(282.797)), ("NP2", 3, pytest.approx(12.2))] == [
+            (usage["Charger"], usage["Sessions"], usage["Energy"]) for usage in stored_usage_data["Usage"]
+        ]
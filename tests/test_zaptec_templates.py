@@ -0,0 +1,53 @@
+import jinja2
+import pytest
+import responses
+import yaml
+
+from zaptec_reporter import reporter as zreporter
+from zaptec_reporter import templates as ztemplates
+
+
+class TestTemplates:
+    def test_compile_once(self):
+        template = ztemplates.compile_template("Report for {{ Metadata.From }}")
+
+        assert template is ztemplates.compile_template("Report for {{ Metadata.From }}")
+        assert "Report for 2024-12" == template.render({"Metadata": {"From": "2024-12"}})
+
+    def test_bytecode_cache(self, tmp_path):
+        ztemplates.configure(tmp_path)
+        try:
+            ztemplates.compile_template("{{ Usage|length }} chargers, cached")
+        finally:
+            ztemplates.configure(None)
+
+        assert 1 == len(list(tmp_path.iterdir()))
+
+    @responses.activate
+    def test_syntax_error_at_startup(self, tmp_path):
+        email_path = tmp_path / "email_config.yml"
+        with open(email_path, "w") as f:
+            yaml.dump(
+                {
+                    "server": {
+                        "address": "localhost",
+                        "username": "nikola",
+                        "password": "Zaptec!23",
+                        "port": 2525,
+                        "encryption": "disabled",
+                    },
+                    "subject": "Zaptec charge report for {{ Metadata.From.strftime('%Y-%m') }",
+                    "filename": "charger_report.xlsx",
+                    "from": {"name": "Zaptec Reporter", "address": "nikola.tesla@mail.com"},
+                    "to": "thomas.edison@mail.com",
+                    "text": "Hello",
+                },
+                f,
+            )
+
+        # Verify that the broken subject is found before any installation report is fetched.
+        with pytest.raises(jinja2.TemplateSyntaxError) as excinfo:
+            zreporter.main(f"-p token --no-cache report -e {email_path} aaaa-aaa-aaaa".split())
+
+        assert "email subject" == excinfo.value.filename
+        assert 0 == len(responses.calls)
@@ -0,0 +1,56 @@
+import random
+
+import pandas as pd
+
+from zaptec_reporter import usage as zusage
+
+
+class TestUsage:
+    def test_aggregate_usage(self, installation_report):
+        usage = zusage.aggregate_usage(
+            [
+                installation_report("Installation A", [("NP1", 11, 272.797, 279.0285275)]),
+                installation_report("Installation B", [("VP1", 2, 43.114, 10.500001), ("VP2", 0, 0.0, 0.0)]),
+            ]
+        )
+
+        # Verify that durations are kept numeric, and only formatted when presented.
+        assert [1004503, 37800, 0] == list(usage.columns["Duration"])
+        assert 3 == len(usage)
+        assert usage == [
+            {
+                "Charger": "NP1",
+                "Energy": 272.797,
+                "Duration": "11 days 15:01:43",
+                "Sessions": 11,
+                "Installation": "Installation A",
+            },
+            {
+                "Charger": "VP1",
+                "Energy": 43.114,
+                "Duration": "0 days 10:30:00",
+                "Sessions": 2,
+                "Installation": "Installation B",
+            },
+            {
+                "Charger": "VP2",
+                "Energy": 0.0,
+                "Duration": "0 days 00:00:00",
+                "Sessions": 0,
+                "Installation": "Installation B",
+            },
+        ]
+        assert list(usage)[1] == usage[1]
+        assert list(usage)[1:] == usage[1:]
+
+    def test_duration_like_pandas(self, installation_report):
+        # Verify that durations are rounded and formatted just like pd.Timedelta(hours=...).round("s").
+        rng = random.Random(1)
+        hours = [rng.random() * 1000 for _ in range(1000)] + [0.5 / 3600, 1.5 / 3600, 24.0]
+        usage = zusage.aggregate_usage(
+            [installation_report("Installation A", [("NP1", 1, 1.0, duration) for duration in hours])]
+        )
+
+        assert [str(pd.Timedelta(hours=duration).round("s")) for duration in hours] == [
+            row["Duration"] for row in usage
+        ]